@@ -1,130 +1,457 @@
 # Version 2.0
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import StandardScaler
-from sklearn.feature_extraction.text import TfidfVectorizer
-from collections import defaultdict
-import pickle
-import os
+import threading
+from typing import NamedTuple
+import config
+from search_index import SearchIndex, top_k
+from interaction_matrix import InteractionMatrix
+from item_similarity import ItemNeighbors
+from als_recommender import ImplicitALS
+from batch_recommender import BatchScorer, iter_recommendations
+from content_profiles import CatalogEncoding
+from model_store import ModelStore, data_fingerprint
+from feature_store import compute_member_stats
+from embedding_search import EmbeddingCache, SemanticIndex, make_encoder
+from trigram_index import TrigramIndex
+from result_cache import ResultCache
+from instrumentation import instrument_class
+
+class TrainedModels(NamedTuple):
+    """Immutable snapshot of the fitted models; replaced as a whole, never mutated"""
+    late_predictor: object = None
+    late_predictor_version: str = None
+    scaler: object = None
+    cluster_centroids: object = None
+    cluster_version: str = None
 
 class AIEngine:
-    def __init__(self):
+    def __init__(self, store=None):
+        # Nothing is loaded or fitted here; models and indexes (and sklearn) are
+        # brought in by the first feature that needs them
         self.nlp_model = None
-        self.late_predictor = RandomForestClassifier(n_estimators=10, random_state=42)
-        self.late_predictor.fit([[14, 0.0, 0.0], [7, 0.5, 10.0]], [0, 1])
-        self.scaler = StandardScaler()
+        self.store = store or ModelStore(config.ARTIFACT_DIR, keep=config.ARTIFACT_VERSIONS_KEPT)
+        self._publish_lock = threading.Lock()
+        self._models = None
+        self.search_index = None
+        self._search_index_loaded = False
+        self._search_index_lock = threading.Lock()
+        self._search_index_dirty = False
+        self.semantic_index = None
+        self.trigram_index = None
+        self.interactions = None
+        self.item_neighbors = None
+        self.als = None
+        self._als_stale = set()
+        self.catalog = None
+        self.data_version = 0
+        self.result_cache = ResultCache(maxsize=config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL_SECONDS)
+    
+    def _load_models(self):
+        late_predictor = self.store.load('late_predictor')
+        cluster_model = self.store.load('cluster_model') or {}
+        return TrainedModels(
+            late_predictor=late_predictor,
+            late_predictor_version=self.store.fingerprint('late_predictor') if late_predictor else None,
+            scaler=cluster_model.get('scaler'),
+            cluster_centroids=cluster_model.get('centroids'),
+            cluster_version=self.store.fingerprint('cluster_model') if cluster_model else None
+        )
+    
+    @property
+    def models(self):
+        """Current TrainedModels snapshot, loaded from the artifact store on first use"""
+        models = self._models
+        if models is None:
+            with self._publish_lock:
+                if self._models is None:
+                    self._models = self._load_models()
+                models = self._models
+        return models
+    
+    def _publish(self, **changes):
+        """Swap in a new model snapshot; readers see either the old or the new one"""
+        with self._publish_lock:
+            current = self._models if self._models is not None else self._load_models()
+            self._models = current._replace(**changes)
+    
+    @property
+    def late_predictor(self):
+        return self.models.late_predictor
+    
+    @property
+    def scaler(self):
+        return self.models.scaler
+    
+    def _bump_data_version(self):
+        """Invalidate cached results after a LibraryManager write"""
+        self.data_version += 1
+        self.result_cache.clear()
+    
+    @staticmethod
+    def _frame_key(df):
+        """Cheap identity of a table snapshot, as used by the index matches() checks"""
+        if df.empty or 'id' not in df:
+            return (len(df),)
+        return (len(df), df['id'].iloc[-1])
+    
+    def cache_stats(self):
+        """Result cache counters (hits, misses, hit_rate, size, evictions, ...)"""
+        return dict(self.result_cache.stats(), data_version=self.data_version)
+    
+    def on_book_added(self, book):
+        """Keep the search index in sync when LibraryManager adds a book"""
+        self.on_books_added([book])
+    
+    def on_books_added(self, books):
+        """Add a batch of books (e.g. one bulk import batch) to the loaded indexes"""
+        self._bump_data_version()
+        if self.catalog is not None:
+            self.catalog.add_books(books)
+        if self.semantic_index is not None:
+            self.semantic_index.add_books(books)
+        if self.trigram_index is not None:
+            self.trigram_index.add_books(books)
+        if self.search_index is not None:
+            self._add_to_search_index(books)
+    
+    def _add_to_search_index(self, books):
+        with self._search_index_lock:
+            refitted = self.search_index.add_books(books)
+            # Saving the whole index per added book would put a full pickle on the
+            # request path; only a refit is saved here, appends by save_search_index()
+            if refitted:
+                self.store.save('search_index', self.search_index, self.search_index.fingerprint())
+            self._search_index_dirty = not refitted
+    
+    def save_search_index(self):
+        """Persist the search index if books were appended since it was last saved; returns True if saved
+        
+        BackgroundTrainer calls this after each run, off the request path.
+        """
+        with self._search_index_lock:
+            if self.search_index is None or not self._search_index_dirty:
+                return False
+            self.store.save('search_index', self.search_index, self.search_index.fingerprint())
+            self._search_index_dirty = False
+            return True
+        
+    def on_book_borrowed(self, transaction):
+        """Record a new borrow in the interaction matrix"""
+        self._bump_data_version()
+        if self.interactions is not None:
+            self.interactions.add_borrow(transaction['member_id'], transaction['book_id'], transaction['id'])
+        if self.als is not None:
+            # Folded in on the member's next ALS request
+            self._als_stale.add(transaction['member_id'])
+    
+    def on_book_returned(self, transaction):
+        self._bump_data_version()
+    
+    def _get_interactions(self, transactions_df):
+        if self.interactions is None or not self.interactions.matches(transactions_df):
+            self.interactions = InteractionMatrix().build(transactions_df)
+        return self.interactions
+    
+    def collaborative_filtering(self, transactions_df, member_id, top_n=5, n_neighbors=5, method='user'):
+        """Recommend books based on similar users' borrowing patterns
         
-    def collaborative_filtering(self, transactions_df, member_id, top_n=5):
-        """Recommend books based on similar users' borrowing patterns"""
+        method='als' ranks books with implicit-feedback matrix factorization
+        instead of the member-member cosine neighbourhood.
+        """
         if transactions_df.empty:
             return []
+        key = ('collaborative', member_id, top_n, n_neighbors, method, self.data_version,
+               self._frame_key(transactions_df))
+        return list(self.result_cache.get_or_compute(
+            key, lambda: self._collaborative_filtering(transactions_df, member_id, top_n, n_neighbors, method)))
+    
+    def _collaborative_filtering(self, transactions_df, member_id, top_n, n_neighbors, method):
+        if method == 'als':
+            return self.als_filtering(transactions_df, member_id, top_n)
         
-        user_book_matrix = transactions_df.pivot_table(
-            index='member_id', columns='book_id', aggfunc='size', fill_value=0
-        )
+        interactions = self._get_interactions(transactions_df)
+        user_row = interactions.member_row(member_id)
+        if user_row is None:
+            return []
+        
+        # Cosine similarity of the target member against every member, one sparse product
+        matrix = interactions.matrix
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        overlap = (matrix @ user_row.T).toarray().ravel()
+        similarity = overlap / np.maximum(norms * norms[interactions.member_index[member_id]], 1e-12)
+        similarity[interactions.member_index[member_id]] = -np.inf
+        
+        neighbors = top_k(similarity, n_neighbors)
+        neighbor_books = matrix[neighbors]
+        scores = np.asarray(neighbor_books.T @ similarity[neighbors]).ravel()
         
-        if member_id not in user_book_matrix.index:
+        candidates = np.asarray(neighbor_books.sum(axis=0)).ravel() > 0
+        candidates[user_row.indices] = False
+        candidate_cols = np.flatnonzero(candidates)
+        best = candidate_cols[top_k(scores[candidate_cols], top_n)]
+        
+        return [(interactions.book_ids[col], float(scores[col])) for col in best]
+    
+    def _get_als(self, transactions_df):
+        interactions = self._get_interactions(transactions_df)
+        # New borrows are folded in per member; the factors are refitted after enough drift
+        if (self.als is None or
+                abs(interactions.n_transactions - self.als.n_transactions) >= config.ALS_REFRESH or
+                interactions.n_transactions < self.als.n_transactions):
+            self.als = ImplicitALS(factors=config.ALS_FACTORS, regularization=config.ALS_REGULARIZATION,
+                                   alpha=config.ALS_ALPHA, iterations=config.ALS_ITERATIONS).fit(interactions)
+            self._als_stale = set()
+        return self.als
+    
+    def als_filtering(self, transactions_df, member_id, top_n=5):
+        """Recommend books from implicit-feedback (ALS) member and book factors"""
+        if transactions_df.empty:
             return []
         
-        user_similarity = cosine_similarity(user_book_matrix)
-        user_idx = list(user_book_matrix.index).index(member_id)
-        similar_users = user_similarity[user_idx].argsort()[-6:-1][::-1]
+        als = self._get_als(transactions_df)
+        user_row = self.interactions.member_row(member_id)
+        if user_row is None:
+            return []
         
-        borrowed_books = set(user_book_matrix.loc[member_id][user_book_matrix.loc[member_id] > 0].index)
-        recommendations = defaultdict(float)
+        row = self.interactions.member_index[member_id]
+        if member_id in self._als_stale or row >= len(als.member_factors):
+            als.fold_in(row, user_row)
+            self._als_stale.discard(member_id)
+        return [(self.interactions.book_ids[col], score)
+                for col, score in als.recommend(row, user_row.indices, top_n)]
+    
+    def _get_item_neighbors(self, transactions_df):
+        interactions = self._get_interactions(transactions_df)
+        # The neighbour table tolerates a few borrows of drift before it is recomputed
+        if (self.item_neighbors is None or
+                abs(interactions.n_transactions - self.item_neighbors.n_transactions) >= config.ITEM_NEIGHBORS_REFRESH or
+                interactions.n_transactions < self.item_neighbors.n_transactions):
+            self.item_neighbors = ItemNeighbors(k=config.ITEM_NEIGHBORS_K).build(interactions)
+        return self.item_neighbors
+    
+    def item_based_filtering(self, transactions_df, member_id, top_n=5):
+        """Recommend books co-borrowed with the books a member already read"""
+        if transactions_df.empty:
+            return []
         
-        for sim_user_idx in similar_users:
-            sim_user_id = user_book_matrix.index[sim_user_idx]
-            sim_score = user_similarity[user_idx][sim_user_idx]
-            user_books = user_book_matrix.loc[sim_user_id]
-            
-            for book_id, count in user_books.items():
-                if count > 0 and book_id not in borrowed_books:
-                    recommendations[book_id] += sim_score * count
+        neighbors = self._get_item_neighbors(transactions_df)
+        user_row = self.interactions.member_row(member_id)
+        if user_row is None:
+            return []
         
-        return sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:top_n]
+        borrowed = [self.interactions.book_ids[col] for col in user_row.indices]
+        return neighbors.recommend(borrowed, top_n)
     
-    def content_based_filtering(self, books_df, member_transactions, top_n=5):
-        """Recommend books based on user's genre/author preferences"""
-        if member_transactions.empty or books_df.empty:
+    def similar_books(self, transactions_df, book_id, top_n=5):
+        """Books most often borrowed by readers of the given book"""
+        if transactions_df.empty:
             return []
+        return self._get_item_neighbors(transactions_df).similar_books(book_id, top_n)
+    
+    def batch_recommend(self, transactions_df, books_df, member_ids=None, method='collaborative',
+                        top_n=5, chunk_size=1000, n_jobs=1):
+        """Yield {member_id: [(book_id, score), ...]} dicts, one per chunk of members.
         
-        user_genres = member_transactions['genre'].value_counts().to_dict()
-        user_authors = member_transactions['author'].value_counts().to_dict()
+        Scores every member (or just member_ids) with sparse matrix products instead of
+        one collaborative_filtering/content_based_filtering call per member. Chunks can be
+        spread over n_jobs worker processes; memory stays bounded by chunk_size.
+        """
+        if member_ids is None:
+            member_ids = transactions_df['member_id'].unique().tolist() if not transactions_df.empty else []
+        if transactions_df.empty or (method == 'content' and books_df.empty):
+            for i in range(0, len(member_ids), chunk_size):
+                yield {member_id: [] for member_id in member_ids[i:i + chunk_size]}
+            return
         
-        borrowed_books = set(member_transactions['book_id'].unique())
-        available_books = books_df[~books_df['id'].isin(borrowed_books)]
+        interactions = self._get_interactions(transactions_df)
+        catalog = self._get_catalog(books_df) if method == 'content' else None
+        scorer = BatchScorer(interactions, catalog, method=method, top_n=top_n)
         
-        scores = []
-        for _, book in available_books.iterrows():
-            score = user_genres.get(book['genre'], 0) * 2 + user_authors.get(book['author'], 0)
-            scores.append((book['id'], score))
+        # Members without any borrows get no recommendations, as in the per-member methods
+        known = [m for m in member_ids if m in interactions.member_index]
+        unknown = [m for m in member_ids if m not in interactions.member_index]
+        rows = np.array([interactions.member_index[m] for m in known], dtype=np.int64)
         
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:top_n]
+        offset = 0
+        for results in iter_recommendations(scorer, rows, chunk_size=chunk_size, n_jobs=n_jobs):
+            yield dict(zip(known[offset:offset + len(results)], results))
+            offset += len(results)
+        for i in range(0, len(unknown), chunk_size):
+            yield {member_id: [] for member_id in unknown[i:i + chunk_size]}
+    
+    def _get_catalog(self, books_df):
+        if self.catalog is None or not self.catalog.matches(books_df):
+            self.catalog = CatalogEncoding().build(books_df)
+        return self.catalog
     
-    def cluster_members(self, members_df, transactions_df, n_clusters=4):
-        """Cluster members by reading habits"""
+    def content_based_filtering(self, books_df, member_transactions, top_n=5, by_member=False):
+        """Recommend books based on user's genre/author preferences
+        
+        With by_member=True, member_transactions may cover many members and a
+        {member_id: recommendations} dict is returned; only single-member results
+        are cached.
+        """
+        if member_transactions.empty or books_df.empty:
+            return {} if by_member else []
+        
+        catalog = self._get_catalog(books_df)
+        if not by_member:
+            key = ('content', tuple(member_transactions['book_id'].tolist()), top_n, self.data_version,
+                   self._frame_key(books_df))
+            return list(self.result_cache.get_or_compute(key, lambda: catalog.recommend(
+                catalog.borrow_counts(np.zeros(len(member_transactions), dtype=np.int64),
+                                      member_transactions['book_id'], 1), top_n)[0]))
+        
+        member_codes, member_ids = pd.factorize(member_transactions['member_id'])
+        counts = catalog.borrow_counts(member_codes, member_transactions['book_id'], len(member_ids))
+        return dict(zip(member_ids, catalog.recommend(counts, top_n)))
+    
+    @staticmethod
+    def member_features(members_df, transactions_df, member_stats=None):
+        """Per-member [borrows, fines, returned, late], from the feature store when given"""
+        if member_stats is None:
+            member_stats = compute_member_stats(transactions_df)
+        features = member_stats[['borrows', 'fines', 'returned', 'late']]
+        return features.reindex(members_df['id'], fill_value=0).astype(float)
+    
+    @staticmethod
+    def _late_history(transactions_df, member_stats=None):
+        """Per-member late_rate and total_fines over completed loans"""
+        if member_stats is None:
+            member_stats = compute_member_stats(transactions_df)
+        return member_stats[['late_rate', 'fines']].rename(columns={'fines': 'total_fines'})
+    
+    def cluster_members(self, members_df, transactions_df, n_clusters=4, mode='kmeans', member_stats=None):
+        """Cluster members by reading habits
+        
+        mode='minibatch' fits MiniBatchKMeans, which scales to large memberships;
+        either way the scaler and centroids are kept (and saved) so assign_clusters
+        can place new or changed members without refitting. The model is only refitted
+        when the member features differ from the ones it was fitted on.
+        """
         if members_df.empty or transactions_df.empty:
             return {}
         
-        member_features = []
-        member_ids = []
-        
-        for member_id in members_df['id']:
-            member_trans = transactions_df[transactions_df['member_id'] == member_id]
-            
-            features = [
-                len(member_trans),
-                member_trans['fine'].sum(),
-                len(member_trans[member_trans['status'] == 'returned']),
-                len(member_trans[member_trans['return_date'].notna() & 
-                    (member_trans['return_date'] > member_trans['due_date'])])
-            ]
-            member_features.append(features)
-            member_ids.append(member_id)
-        
-        if len(member_features) < n_clusters:
-            n_clusters = max(1, len(member_features))
-        
-        X = self.scaler.fit_transform(member_features)
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        clusters = kmeans.fit_predict(X)
-        
-        cluster_labels = ['Casual Readers', 'Regular Readers', 'Heavy Readers', 'Late Returners']
-        return {member_ids[i]: cluster_labels[clusters[i] % len(cluster_labels)] for i in range(len(member_ids))}
-    
-    def train_late_predictor(self, transactions_df):
-        """Train model to predict late returns"""
-        if transactions_df.empty:
-            # Create a dummy model with minimal data
-            X = np.array([[14, 0.0, 0.0], [7, 0.5, 10.0]])
-            y = np.array([0, 1])
-            self.late_predictor = RandomForestClassifier(n_estimators=10, random_state=42)
-            self.late_predictor.fit(X, y)
+        features = self.member_features(members_df, transactions_df, member_stats)
+        models = self.models
+        version = self._cluster_version(features, n_clusters, mode)
+        if version != models.cluster_version or models.cluster_centroids is None:
+            models = self._fit_clusters(features, n_clusters, mode, version)
+            self._publish(scaler=models.scaler, cluster_centroids=models.cluster_centroids,
+                          cluster_version=models.cluster_version)
+        
+        return dict(zip(features.index.tolist(), self.assign_clusters(features.values, models)))
+    
+    @staticmethod
+    def _cluster_version(features, n_clusters, mode):
+        n_clusters = max(1, min(n_clusters, len(features)))
+        return f"{data_fingerprint(features.reset_index())}-{mode}-{n_clusters}"
+    
+    def _fit_clusters(self, features, n_clusters, mode, version):
+        """Fit a fresh scaler and centroids, save them, and return them as a snapshot"""
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
+        n_clusters = max(1, min(n_clusters, len(features)))
+        scaler = StandardScaler()
+        X = scaler.fit_transform(features.values)
+        if mode == 'minibatch':
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3, batch_size=1024)
+        else:
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        kmeans.fit(X)
+        self.store.save('cluster_model', {'scaler': scaler, 'centroids': kmeans.cluster_centers_},
+                        version, mode=mode, n_clusters=n_clusters)
+        return TrainedModels(scaler=scaler, cluster_centroids=kmeans.cluster_centers_, cluster_version=version)
+    
+    def assign_clusters(self, features, models=None):
+        """Cluster labels for rows of member features, using the last fitted model"""
+        models = models or self.models
+        if models.cluster_centroids is None:
+            return []
+        X = models.scaler.transform(np.atleast_2d(np.asarray(features, dtype=float)))
+        distances = ((X[:, None, :] - models.cluster_centroids[None, :, :]) ** 2).sum(axis=2)
+        return [config.CLUSTER_LABELS[c % len(config.CLUSTER_LABELS)] for c in distances.argmin(axis=1)]
+    
+    @staticmethod
+    def _dummy_late_predictor():
+        """Model fitted on two synthetic samples, used until there is real history"""
+        from sklearn.ensemble import RandomForestClassifier
+        X = np.array([[14, 0.0, 0.0], [7, 0.5, 10.0]])
+        y = np.array([0, 1])
+        model = RandomForestClassifier(n_estimators=10, random_state=42)
+        model.fit(X, y)
+        return model
+    
+    def _current_late_predictor(self):
+        late_predictor = self.models.late_predictor
+        if late_predictor is None:
+            dummy = self._dummy_late_predictor()
+            # Compare-and-set: a model the trainer published while the dummy was being
+            # fitted must win, or its fingerprint would keep retrain() from replacing the dummy
+            with self._publish_lock:
+                current = self._models if self._models is not None else self._load_models()
+                if current.late_predictor is None:
+                    current = current._replace(late_predictor=dummy)
+                self._models = current
+                late_predictor = current.late_predictor
+        return late_predictor
+    
+    def train_late_predictor(self, transactions_df, force=False, member_stats=None):
+        """Train model to predict late returns
+        
+        Skipped when the transactions are unchanged since the stored model was trained.
+        """
+        version = data_fingerprint(transactions_df)
+        models = self.models
+        if not force and models.late_predictor is not None and version == models.late_predictor_version:
             return
         
+        late_predictor = self._fit_late_predictor(transactions_df, member_stats)
+        self.store.save('late_predictor', late_predictor, version)
+        self._publish(late_predictor=late_predictor, late_predictor_version=version)
+    
+    def retrain(self, members_df, transactions_df, member_stats=None, n_clusters=4, mode='kmeans', force=False):
+        """Refit the late predictor and clustering off to the side, then publish both at once
+        
+        Requests running meanwhile keep using the previous snapshot. Models whose
+        input data is unchanged are carried over. Returns True if anything was refitted.
+        """
+        current = self.models
+        updated = current
+        
+        late_version = data_fingerprint(transactions_df)
+        if force or current.late_predictor is None or late_version != current.late_predictor_version:
+            late_predictor = self._fit_late_predictor(transactions_df, member_stats)
+            self.store.save('late_predictor', late_predictor, late_version)
+            updated = updated._replace(late_predictor=late_predictor, late_predictor_version=late_version)
+        
+        if not members_df.empty and not transactions_df.empty:
+            features = self.member_features(members_df, transactions_df, member_stats)
+            cluster_version = self._cluster_version(features, n_clusters, mode)
+            if force or cluster_version != current.cluster_version or current.cluster_centroids is None:
+                clusters = self._fit_clusters(features, n_clusters, mode, cluster_version)
+                updated = updated._replace(scaler=clusters.scaler, cluster_centroids=clusters.cluster_centroids,
+                                           cluster_version=clusters.cluster_version)
+        
+        if updated is current:
+            return False
+        self._publish(**updated._asdict())
+        return True
+    
+    def _fit_late_predictor(self, transactions_df, member_stats=None):
+        if transactions_df.empty:
+            return self._dummy_late_predictor()
+        
         completed = transactions_df[transactions_df['return_date'].notna()].copy()
         if completed.empty or len(completed) < 2:
-            # Create a dummy model with minimal data
-            X = np.array([[14, 0.0, 0.0], [7, 0.5, 10.0]])
-            y = np.array([0, 1])
-            self.late_predictor = RandomForestClassifier(n_estimators=10, random_state=42)
-            self.late_predictor.fit(X, y)
-            return
+            return self._dummy_late_predictor()
         
         completed['is_late'] = (completed['return_date'] > completed['due_date']).astype(int)
         completed['borrow_duration'] = (completed['due_date'] - completed['borrow_date']).dt.days
         
-        member_stats = completed.groupby('member_id').agg({
-            'is_late': 'mean',
-            'fine': 'sum'
-        }).reset_index()
-        member_stats.columns = ['member_id', 'late_rate', 'total_fines']
-        
-        completed = completed.merge(member_stats, on='member_id', how='left')
+        history = self._late_history(completed, member_stats)
+        completed = completed.merge(history, left_on='member_id', right_index=True, how='left')
         
         features = ['borrow_duration', 'late_rate', 'total_fines']
         X = completed[features].fillna(0)
@@ -136,41 +463,171 @@ class AIEngine:
             X = np.vstack([X.values, [[14, 0.0, 0.0], [7, 0.5, 10.0]]])
             y = np.concatenate([y.values, [0, 1]])
         
-        self.late_predictor = RandomForestClassifier(n_estimators=50, random_state=42)
-        self.late_predictor.fit(X, y)
+        from sklearn.ensemble import RandomForestClassifier
+        model = RandomForestClassifier(n_estimators=50, random_state=42)
+        model.fit(X, y)
+        return model
     
-    def predict_late_return(self, member_id, borrow_duration, transactions_df):
+    def predict_late_return(self, member_id, borrow_duration, transactions_df, member_stats=None):
         """Predict if a member will return late"""
-        member_trans = transactions_df[
-            (transactions_df['member_id'] == member_id) & 
-            (transactions_df['return_date'].notna())
-        ]
+        if member_stats is None:
+            member_stats = compute_member_stats(transactions_df[transactions_df['member_id'] == member_id])
+        history = self._late_history(transactions_df, member_stats)
         
-        if member_trans.empty:
+        if member_id in history.index:
+            late_rate = float(history.at[member_id, 'late_rate'])
+            total_fines = float(history.at[member_id, 'total_fines'])
+        else:
             late_rate = 0.0
             total_fines = 0.0
-        else:
-            late_rate = float((member_trans['return_date'] > member_trans['due_date']).sum() / len(member_trans))
-            total_fines = float(member_trans['fine'].sum())
         
         features = np.array([[float(borrow_duration), late_rate, total_fines]])
-        proba = self.late_predictor.predict_proba(features)
+        proba = self._current_late_predictor().predict_proba(features)
         return float(proba[0][1])
     
-    def nlp_search(self, query, books_df):
-        """Search books using TF-IDF (lightweight NLP)"""
+    def predict_late_returns(self, transactions_df, loans=None, member_stats=None):
+        """Late-return probability for many open loans with a single predict_proba call
+        
+        loans defaults to every transaction still marked 'borrowed'. Returns the loans'
+        id and member_id columns with a 'late_risk' column added.
+        """
+        if loans is None:
+            loans = transactions_df[transactions_df['status'] == 'borrowed']
+        result = loans[['id', 'member_id']].copy()
+        if loans.empty:
+            result['late_risk'] = pd.Series(dtype=float)
+            return result
+        
+        history = self._late_history(transactions_df, member_stats)
+        history = history.reindex(loans['member_id']).fillna(0.0)
+        
+        duration = (pd.to_datetime(loans['due_date']) - pd.to_datetime(loans['borrow_date'])).dt.days
+        features = np.column_stack([
+            duration.to_numpy(dtype=float),
+            history['late_rate'].to_numpy(dtype=float),
+            history['total_fines'].to_numpy(dtype=float)
+        ])
+        
+        result['late_risk'] = self._current_late_predictor().predict_proba(features)[:, 1]
+        return result
+    
+    def nlp_search(self, query, books_df, top_n=5, mode='tfidf'):
+        """Search books using TF-IDF (lightweight NLP)
+        
+        mode='semantic' ranks by embeddings, mode='fuzzy' tolerates typos in titles and
+        authors via the trigram index.
+        """
         if books_df.empty:
             return []
+        key = ('nlp_search', query, top_n, mode, self.data_version, self._frame_key(books_df))
+        return list(self.result_cache.get_or_compute(key, lambda: self._nlp_search(query, books_df, top_n, mode)))
+    
+    def _nlp_search(self, query, books_df, top_n, mode):
+        if mode == 'semantic':
+            return self.semantic_search([query], books_df, top_n)[0]
+        if mode == 'fuzzy':
+            return self._get_trigram_index(books_df).search(query, top_n)
         
-        book_texts = (books_df['title'] + ' ' + books_df['author'] + ' ' + books_df['genre']).tolist()
+        return self._get_search_index(books_df).search(query, top_n)
+    
+    def _get_search_index(self, books_df):
+        if not self._search_index_loaded:
+            if self.search_index is None:
+                self.search_index = self.store.load('search_index')
+            self._search_index_loaded = True
+        index = self.search_index
+        if index is not None and not index.matches(books_df) and len(books_df) > index.size and \
+                np.array_equal(books_df['id'].to_numpy(dtype=np.int64)[:index.size], index.book_ids):
+            # A saved index that missed the latest appends only needs those books added
+            self._add_to_search_index(books_df.iloc[index.size:][['id', 'title', 'author', 'genre']].to_dict('records'))
+        if self.search_index is None or not self.search_index.matches(books_df):
+            self.search_index = SearchIndex().build(books_df)
+            self.store.save('search_index', self.search_index, self.search_index.fingerprint())
+        return self.search_index
+    
+    def _get_semantic_index(self, books_df):
+        if self.semantic_index is None:
+            encoder = make_encoder(config.EMBEDDING_MODEL_DIR, config.EMBEDDING_DIM)
+            self.semantic_index = SemanticIndex(EmbeddingCache(config.EMBEDDING_CACHE_DIR, encoder))
+        if not self.semantic_index.matches(books_df):
+            self.semantic_index.build(books_df)
+        return self.semantic_index
+    
+    def _get_trigram_index(self, books_df):
+        if self.trigram_index is None or not self.trigram_index.matches(books_df):
+            self.trigram_index = TrigramIndex().build(books_df)
+        return self.trigram_index
+    
+    def autocomplete(self, prefix, books_df, limit=8):
+        """Ids of books whose title or author contains a word sequence starting with prefix"""
+        if books_df.empty:
+            return []
+        return self._get_trigram_index(books_df).complete(prefix, limit)
+    
+    def search_books(self, query, books_df, genre=None, author=None, available_only=False,
+                     offset=0, limit=10, mode='tfidf'):
+        """Filtered, paginated search
+        
+        Filters are applied as boolean masks before ranking. Returns a dict with the
+        number of matching books ('total'), the requested page of hits joined with the
+        book columns plus a 'score' column ('hits'), and genre/availability counts over
+        all matches ('facets'). An empty query lists every book that passes the filters;
+        semantic mode ranks every book that passes them.
+        """
+        hits = books_df.iloc[:0].assign(score=pd.Series(dtype=float))
+        if books_df.empty:
+            return {'total': 0, 'hits': hits, 'facets': {'genre': {}, 'available': {}}}
         
-        vectorizer = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform(book_texts + [query])
+        catalog = self._get_catalog(books_df)
+        mask = np.ones(len(books_df), dtype=bool)
+        if genre:
+            mask &= catalog.genre_mask(genre)
+        if author:
+            mask &= catalog.author_mask(author)
+        available = books_df['available_copies'].to_numpy() > 0
+        if available_only:
+            mask &= available
         
-        query_vec = tfidf_matrix[-1]
-        book_vecs = tfidf_matrix[:-1]
+        query = (query or '').strip()
+        if not query:
+            scores = np.zeros(len(books_df))
+        elif mode == 'semantic':
+            scores = self._get_semantic_index(books_df).scores_many([query])[:, 0]
+        elif mode == 'fuzzy':
+            scores = self._get_trigram_index(books_df).scores(query)
+        else:
+            scores = self._get_search_index(books_df).scores(query)
+        if query and mode != 'semantic':
+            # Keyword search only returns books sharing a term with the query
+            mask &= scores > 0
         
-        similarities = cosine_similarity(query_vec, book_vecs)[0]
-        top_indices = similarities.argsort()[-5:][::-1]
+        matched = np.flatnonzero(mask)
+        if query:
+            page = matched[top_k(scores[matched], offset + limit)][offset:]
+        else:
+            page = matched[offset:offset + limit]
+        hits = books_df.iloc[page].assign(score=scores[page])
         
-        return [(books_df.iloc[i]['id'], similarities[i]) for i in top_indices]
+        genre_counts = np.bincount(catalog.genre_codes[matched], minlength=len(catalog.genre_index))
+        genre_names = list(catalog.genre_index)
+        facets = {
+            'genre': {genre_names[c]: int(genre_counts[c]) for c in np.argsort(-genre_counts, kind='stable')
+                      if genre_counts[c] > 0},
+            'available': {'available': int(available[matched].sum()),
+                          'unavailable': int((~available[matched]).sum())}
+        }
+        return {'total': len(matched), 'hits': hits, 'facets': facets}
+    
+    def semantic_search(self, queries, books_df, top_n=5):
+        """Embedding search for a batch of queries; one result list per query
+        
+        Uses the Sentence Transformers model in config.EMBEDDING_MODEL_DIR when present,
+        otherwise a deterministic hashing encoder. Book embeddings are cached on disk by
+        content hash, so only new or changed books are encoded.
+        """
+        if books_df.empty:
+            return [[] for _ in queries]
+        
+        return self._get_semantic_index(books_df).search_many(queries, top_n)
+
+instrument_class(AIEngine, 'engine')
@@ -0,0 +1,106 @@
+"""Implicit-feedback matrix factorization (alternating least squares)"""
+
+import numpy as np
+from scipy import sparse
+from search_index import top_k
+
+
+class ImplicitALS:
+    """Hu/Koren/Volinsky implicit ALS on the member x book borrow-count matrix.
+
+    Borrow counts r become confidences 1 + alpha * r on a binary preference.
+    Only the compact factor matrices are kept; a member's vector can be
+    recomputed on its own (fold-in) after a borrow without refitting.
+    """
+
+    def __init__(self, factors=32, regularization=0.1, alpha=10.0, iterations=10, cg_steps=3,
+                 random_state=42):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.random_state = random_state
+        self.member_factors = np.empty((0, factors), dtype=np.float32)
+        self.book_factors = np.empty((0, factors), dtype=np.float32)
+        self.n_transactions = 0
+
+    def _solve(self, confidence, fixed, current):
+        """Update every row of current against the fixed factors.
+
+        Each row's normal equations (F'F + F_u' (C_u - I) F_u + reg) x = F_u' C_u p_u
+        are solved approximately with a few conjugate-gradient steps, warm-started
+        from the current factors. Every step is a handful of sparse products over
+        all rows at once, so no per-row Python loop or k x k matrix is needed.
+        """
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors)
+        rows = np.repeat(np.arange(confidence.shape[0]), np.diff(confidence.indptr))
+        gathered = fixed[confidence.indices]
+
+        def apply(x):
+            # (C_u - I) weights scatter back through a sparse matrix with the per-entry dots as data
+            dots = np.einsum('ij,ij->i', gathered, x[rows]) * confidence.data
+            return x @ gram + sparse.csr_matrix((dots, confidence.indices, confidence.indptr),
+                                                shape=confidence.shape) @ fixed
+
+        b = sparse.csr_matrix((1.0 + confidence.data, confidence.indices, confidence.indptr),
+                              shape=confidence.shape) @ fixed
+        x = current.copy()
+        r = b - apply(x)
+        p = r.copy()
+        rs_old = np.einsum('ij,ij->i', r, r)
+        for _ in range(self.cg_steps):
+            Ap = apply(p)
+            pAp = np.einsum('ij,ij->i', p, Ap)
+            step = np.divide(rs_old, pAp, out=np.zeros_like(rs_old), where=pAp > 0)
+            x += step[:, None] * p
+            r -= step[:, None] * Ap
+            rs_new = np.einsum('ij,ij->i', r, r)
+            p = r + np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)[:, None] * p
+            rs_old = rs_new
+        return x
+
+    def fit(self, interactions):
+        """Fit factors to an InteractionMatrix"""
+        matrix = interactions.matrix.tocsr().astype(np.float64)
+        weighted = matrix.copy()
+        weighted.data = self.alpha * weighted.data
+        weighted_t = weighted.T.tocsr()
+
+        rng = np.random.default_rng(self.random_state)
+        members = rng.normal(scale=0.01, size=(matrix.shape[0], self.factors))
+        books = rng.normal(scale=0.01, size=(matrix.shape[1], self.factors))
+        for _ in range(self.iterations):
+            members = self._solve(weighted, books, members)
+            books = self._solve(weighted_t, members, books)
+
+        self.member_factors = members.astype(np.float32)
+        self.book_factors = books.astype(np.float32)
+        self.n_transactions = interactions.n_transactions
+        return self
+
+    def fold_in(self, row, user_row):
+        """Recompute one member's factors from their (sparse) borrow-count row"""
+        books = self.book_factors.astype(np.float64)
+        user_row = sparse.csr_matrix(user_row)
+        cols = user_row.indices[user_row.indices < len(books)]
+        weights = self.alpha * user_row.data[user_row.indices < len(books)]
+        vector = np.zeros(self.factors)
+        if len(cols):
+            factors_u = books[cols]
+            A = books.T @ books + (factors_u.T * weights) @ factors_u + self.regularization * np.eye(self.factors)
+            vector = np.linalg.solve(A, factors_u.T @ (1.0 + weights))
+        if row >= len(self.member_factors):
+            grown = np.zeros((row + 1, self.factors), dtype=np.float32)
+            grown[:len(self.member_factors)] = self.member_factors
+            self.member_factors = grown
+        self.member_factors[row] = vector
+
+    def recommend(self, row, exclude_cols, top_n=5):
+        """Top-N (column, score) pairs for a member row with one matrix-vector product"""
+        scores = self.book_factors @ self.member_factors[row]
+        candidates = np.ones(len(scores), dtype=bool)
+        candidates[exclude_cols[exclude_cols < len(scores)]] = False
+        candidate_cols = np.flatnonzero(candidates)
+        best = candidate_cols[top_k(scores[candidate_cols], top_n)]
+        return [(col, float(scores[col])) for col in best]
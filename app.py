@@ -2,9 +2,16 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from library_manager import LibraryManager
+from models import Transaction
 from ai_engine import AIEngine
+from model_trainer import BackgroundTrainer
+from reconciler import CounterReconciler
+from instrumentation import metrics
+import config
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
+import time
 
 # Page config
 st.set_page_config(page_title="AI Library System", layout="wide", initial_sidebar_state="expanded")
@@ -165,9 +172,20 @@ st.markdown("""
 def init_system():
     manager = LibraryManager()
     engine = AIEngine()
-    return manager, engine
+    trainer = BackgroundTrainer(engine, lambda: manager, interval=config.RETRAIN_INTERVAL_SECONDS,
+                                retrain_after=config.RETRAIN_AFTER_TRANSACTIONS)
+    manager.add_listener(engine)
+    manager.add_listener(trainer)
+    # Don't train at startup: models load lazily, and a retrain is requested
+    # when a page first needs one that does not exist yet
+    trainer.start(train_now=False)
+    reconciler = CounterReconciler(manager, interval=config.COUNTER_RECONCILE_INTERVAL_SECONDS).start()
+    return manager, engine, trainer, reconciler
 
-manager, ai_engine = init_system()
+manager, ai_engine, trainer, reconciler = init_system()
+# The manager is shared by every user; each script run gets its own session.
+# Releasing here too covers runs cut short by st.rerun()
+manager.release_session()
 
 # Sidebar
 with st.sidebar:
@@ -193,6 +211,7 @@ with st.sidebar:
     st.markdown("**Version:** 1.0.0")
 
 # Main Content
+page_start = time.perf_counter()
 if menu == "📊 Overview":
     st.title("📊 Library Dashboard")
     
@@ -321,8 +340,8 @@ elif menu == "🔄 Transactions":
     tab1, tab2 = st.tabs(["Borrow Book", "Return Book"])
     
     with tab1:
-        members_df = manager.get_all_members()
-        books_df = manager.get_all_books()
+        members_df = manager.get_all_members(columns=['id', 'name'])
+        books_df = manager.get_all_books(columns=['id', 'title', 'available_copies'])
         
         if not members_df.empty and not books_df.empty:
             with st.form("borrow_book"):
@@ -348,12 +367,12 @@ elif menu == "🔄 Transactions":
             st.warning("Add members and books first")
     
     with tab2:
-        transactions_df = manager.get_all_transactions()
-        active_trans = transactions_df[transactions_df['status'] == 'borrowed']
+        active_trans = manager.get_all_transactions(columns=['id', 'member_id', 'book_id'],
+                                                    where=Transaction.status == 'borrowed')
         
         if not active_trans.empty:
-            books_df = manager.get_all_books()
-            members_df = manager.get_all_members()
+            books_df = manager.get_all_books(columns=['id', 'title'])
+            members_df = manager.get_all_members(columns=['id', 'name'])
             
             active_trans = active_trans.merge(books_df[['id', 'title']], 
                                              left_on='book_id', right_on='id', how='left')
@@ -384,12 +403,17 @@ elif menu == "🤖 AI Insights":
     transactions_df = manager.get_all_transactions()
     
     if not transactions_df.empty:
-        # Train late predictor
-        ai_engine.train_late_predictor(transactions_df)
+        member_stats = manager.get_member_stats()
+        
+        # Models are trained by the background trainer; this page only reads the current snapshot
+        if ai_engine.models.cluster_centroids is None:
+            trainer.request()
+            st.info("⏳ Models are being trained in the background. Refresh in a moment for member clusters.")
         
         # Member Clustering
         st.subheader("👥 Member Clusters")
-        clusters = ai_engine.cluster_members(members_df, transactions_df)
+        features = ai_engine.member_features(members_df, transactions_df, member_stats)
+        clusters = dict(zip(features.index, ai_engine.assign_clusters(features.values)))
         
         if clusters:
             cluster_df = pd.DataFrame(list(clusters.items()), columns=['Member ID', 'Cluster'])
@@ -413,21 +437,18 @@ elif menu == "🤖 AI Insights":
         active_trans = transactions_df[transactions_df['status'] == 'borrowed']
         
         if not active_trans.empty:
-            predictions = []
-            for _, trans in active_trans.iterrows():
-                duration = (pd.to_datetime(trans['due_date']) - pd.to_datetime(trans['borrow_date'])).days
-                risk = ai_engine.predict_late_return(trans['member_id'], duration, transactions_df)
-                predictions.append({
-                    'Transaction ID': trans['id'],
-                    'Member ID': trans['member_id'],
-                    'Late Risk': f"{risk*100:.1f}%",
-                    'Risk Level': 'High' if risk > 0.7 else 'Medium' if risk > 0.4 else 'Low'
-                })
+            risks = ai_engine.predict_late_returns(transactions_df, active_trans, member_stats=member_stats)
+            predictions = pd.DataFrame({
+                'Transaction ID': risks['id'],
+                'Member ID': risks['member_id'],
+                'Late Risk': (risks['late_risk'] * 100).map('{:.1f}%'.format),
+                'Risk Level': np.select([risks['late_risk'] > 0.7, risks['late_risk'] > 0.4],
+                                        ['High', 'Medium'], 'Low')
+            })
             
-            if predictions:
-                pred_df = pd.DataFrame(predictions)
-                pred_df = pred_df.merge(members_df[['id', 'name']], 
-                                       left_on='Member ID', right_on='id', how='left')
+            if not predictions.empty:
+                pred_df = predictions.merge(members_df[['id', 'name']], 
+                                            left_on='Member ID', right_on='id', how='left')
                 
                 st.dataframe(pred_df[['name', 'Late Risk', 'Risk Level']], 
                             use_container_width=True, hide_index=True)
@@ -448,12 +469,17 @@ elif menu == "💡 Recommendations":
                                 options=members_df['id'].tolist(),
                                 format_func=lambda x: members_df[members_df['id']==x]['name'].values[0])
         
+        collab_method = st.radio("Collaborative method", ["Similar members", "Matrix factorization (ALS)"],
+                                 horizontal=True)
+        
         if st.button("Generate Recommendations"):
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             
             with col1:
                 st.subheader("🤝 Collaborative Filtering")
-                collab_recs = ai_engine.collaborative_filtering(transactions_df, member_id)
+                collab_recs = ai_engine.collaborative_filtering(
+                    transactions_df, member_id,
+                    method='als' if collab_method.startswith("Matrix") else 'user')
                 
                 if collab_recs:
                     rec_books = []
@@ -489,6 +515,24 @@ elif menu == "💡 Recommendations":
                     st.dataframe(pd.DataFrame(rec_books), use_container_width=True, hide_index=True)
                 else:
                     st.info("No recommendations available")
+            
+            with col3:
+                st.subheader("🔁 Readers Also Borrowed")
+                item_recs = ai_engine.item_based_filtering(transactions_df, member_id)
+                
+                if item_recs:
+                    rec_books = []
+                    for book_id, score in item_recs:
+                        book = books_df[books_df['id'] == book_id]
+                        if not book.empty:
+                            rec_books.append({
+                                'Title': book.iloc[0]['title'],
+                                'Author': book.iloc[0]['author'],
+                                'Score': f"{score:.2f}"
+                            })
+                    st.dataframe(pd.DataFrame(rec_books), use_container_width=True, hide_index=True)
+                else:
+                    st.info("No recommendations available")
     else:
         st.warning("Add members and books first")
 
@@ -501,31 +545,61 @@ elif menu == "🔍 NLP Search":
     st.markdown("- *'self improvement and habits'*")
     
     query = st.text_input("Enter your search query:")
+    search_mode = st.radio("Search mode", ["Keyword (TF-IDF)", "Fuzzy (typo-tolerant)", "Semantic (embeddings)"],
+                           horizontal=True)
     
-    if query:
-        books_df = manager.get_all_books()
-        
+    books_df = manager.get_all_books()
+    
+    if query and not books_df.empty:
+        suggestions = ai_engine.autocomplete(query, books_df)
+        if suggestions:
+            titles = books_df.set_index('id').loc[suggestions, 'title'].tolist()
+            st.caption("Suggestions: " + " · ".join(titles))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        genre_options = ["All"] + (sorted(books_df['genre'].unique().tolist()) if not books_df.empty else [])
+        genre_filter = st.selectbox("Genre", genre_options)
+    with col2:
+        author_filter = st.text_input("Author")
+    with col3:
+        available_only = st.checkbox("Available only")
+    
+    if query or genre_filter != "All" or author_filter or available_only:
         if not books_df.empty:
-            results = ai_engine.nlp_search(query, books_df)
+            page_size = 10
+            page = st.number_input("Page", min_value=1, value=1, step=1)
+            mode = {'Keyword': 'tfidf', 'Fuzzy': 'fuzzy', 'Semantic': 'semantic'}[search_mode.split()[0]]
+            filters = dict(
+                genre=None if genre_filter == "All" else genre_filter,
+                author=author_filter.strip() or None,
+                available_only=available_only,
+                offset=(page - 1) * page_size, limit=page_size
+            )
+            results = ai_engine.search_books(query, books_df, mode=mode, **filters)
+            if query and mode == 'tfidf' and results['total'] == 0:
+                # Misspelt titles/authors share no words with the catalog; retry typo-tolerant
+                results = ai_engine.search_books(query, books_df, mode='fuzzy', **filters)
+                if results['total']:
+                    st.caption("No exact matches — showing close spellings")
             
-            if results:
-                result_books = []
-                for book_id, similarity in results:
-                    if similarity > 0.0:
-                        book = books_df[books_df['id'] == book_id]
-                        if not book.empty:
-                            result_books.append({
-                                'Title': book.iloc[0]['title'],
-                                'Author': book.iloc[0]['author'],
-                                'Genre': book.iloc[0]['genre'],
-                                'Relevance': f"{similarity*100:.1f}%",
-                                'Available': '✅' if book.iloc[0]['available'] else '❌'
-                            })
+            hits = results['hits']
+            if not hits.empty:
+                st.caption(f"{results['total']} matching books · page {page} of {-(-results['total'] // page_size)}")
+                st.dataframe(pd.DataFrame({
+                    'Title': hits['title'],
+                    'Author': hits['author'],
+                    'Genre': hits['genre'],
+                    'Relevance': (hits['score'] * 100).map('{:.1f}%'.format),
+                    'Available': np.where(hits['available_copies'] > 0, '✅', '❌')
+                }), use_container_width=True, hide_index=True)
                 
-                if result_books:
-                    st.dataframe(pd.DataFrame(result_books), use_container_width=True, hide_index=True)
-                else:
-                    st.info("No matching books found")
+                with st.expander("Refine by genre"):
+                    st.dataframe(pd.DataFrame(list(results['facets']['genre'].items()),
+                                              columns=['Genre', 'Matches']),
+                                 use_container_width=True, hide_index=True)
+                    st.markdown(f"**Available:** {results['facets']['available']['available']} · "
+                                f"**Checked out:** {results['facets']['available']['unavailable']}")
             else:
                 st.info("No matching books found")
         else:
@@ -534,7 +608,7 @@ elif menu == "🔍 NLP Search":
 elif menu == "⚙️ Settings":
     st.title("⚙️ Settings & Reports")
     
-    tab1, tab2 = st.tabs(["Export Reports", "System Info"])
+    tab1, tab2, tab3 = st.tabs(["Export Reports", "System Info", "Diagnostics"])
     
     with tab1:
         st.subheader("📊 Export Data")
@@ -574,11 +648,7 @@ elif menu == "⚙️ Settings":
                 )
             
             if st.button("📥 Export Overdue Books"):
-                transactions_df = manager.get_all_transactions()
-                overdue = transactions_df[
-                    (transactions_df['status'] == 'borrowed') & 
-                    (pd.to_datetime(transactions_df['due_date']) < datetime.now())
-                ]
+                overdue = manager.get_overdue_transactions()
                 if not overdue.empty:
                     csv = overdue.to_csv(index=False)
                     st.download_button(
@@ -612,7 +682,57 @@ elif menu == "⚙️ Settings":
         - ✅ Content-Based Filtering
         - ✅ Member Clustering (K-Means)
         - ✅ Late Return Prediction (Random Forest)
-        - ✅ NLP Search (Sentence Transformers)
+        - ✅ NLP Search (TF-IDF keyword and Sentence Transformers semantic)
         
         **Version:** 1.0.0
         """)
+        
+        cache = ai_engine.cache_stats()
+        st.markdown("**Result Cache:**")
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Hit Rate", f"{cache['hit_rate']:.0%}")
+        c2.metric("Hits / Misses", f"{cache['hits']} / {cache['misses']}")
+        c3.metric("Entries", f"{cache['size']} / {cache['maxsize']}")
+        c4.metric("Data Version", cache['data_version'])
+        
+        last_run = (datetime.fromtimestamp(reconciler.last_run).strftime('%H:%M:%S')
+                    if reconciler.last_run else "not yet")
+        st.caption(f"Dashboard counters reconciled every {reconciler.interval // 60} min "
+                   f"(last run: {last_run}, drift fixed: {reconciler.last_drift or 'none'})")
+        if st.button("🔁 Reconcile Counters Now"):
+            drift = reconciler.run_once()
+            st.success(f"Fixed drift: {drift}" if drift else "Counters match the tables")
+    
+    with tab3:
+        st.subheader("🩺 Diagnostics")
+        st.caption("Call counts, latency percentiles and row counts since startup or the last reset. "
+                   "Latencies are bucketed, so percentiles are accurate to about 10%.")
+        
+        snapshot = metrics.snapshot()
+        if snapshot:
+            diag_df = pd.DataFrame.from_dict(snapshot, orient='index').rename_axis('name').reset_index()
+            diag_df.insert(0, 'source', diag_df['name'].str.split('.', n=1).str[0])
+            source = st.selectbox("Source", ["All"] + sorted(diag_df['source'].unique()))
+            if source != "All":
+                diag_df = diag_df[diag_df['source'] == source]
+            st.dataframe(diag_df.sort_values('total_ms', ascending=False).round(3),
+                        use_container_width=True, hide_index=True)
+        else:
+            st.info("No calls recorded yet." if metrics.enabled else
+                    "Instrumentation is disabled (config.INSTRUMENTATION_ENABLED).")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="📥 Export Diagnostics JSON",
+                data=metrics.to_json(),
+                file_name=f"diagnostics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
+        with col2:
+            if st.button("🔄 Reset Counters"):
+                metrics.reset()
+                st.rerun()
+
+metrics.record(f"app.page {menu}", time.perf_counter() - page_start)
+manager.release_session()
@@ -0,0 +1,108 @@
+"""Chunked, all-members scoring for the collaborative and content-based recommenders"""
+
+import numpy as np
+from scipy import sparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from search_index import top_k
+
+
+class BatchScorer:
+    """Scores many members at once with sparse matrix products.
+
+    Holds everything a chunk needs so it can be shipped to a worker process
+    once and reused for every chunk that worker handles.
+    """
+
+    def __init__(self, interactions, catalog=None, method='collaborative', top_n=5, n_neighbors=5):
+        if method not in ('collaborative', 'content'):
+            raise ValueError(f"Unknown recommendation method: {method}")
+        self.method = method
+        self.top_n = top_n
+        self.n_neighbors = n_neighbors
+        self.matrix = interactions.matrix
+        self.book_ids = np.asarray(interactions.book_ids)
+        self.norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        if method == 'content':
+            self.catalog = catalog
+            # Maps interaction-matrix columns onto catalog positions
+            positions = catalog.positions(self.book_ids)
+            known = np.flatnonzero(positions >= 0)
+            self.column_to_catalog = sparse.csr_matrix(
+                (np.ones(len(known)), (known, positions[known])),
+                shape=(len(self.book_ids), catalog.size))
+
+    def score_chunk(self, rows):
+        """Return a list of top-N (book_id, score) lists, one per interaction row"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.method == 'content':
+            return self._content_chunk(rows)
+        return self._collaborative_chunk(rows)
+
+    def _collaborative_chunk(self, rows):
+        users = self.matrix[rows]
+        similarity = (users @ self.matrix.T).tocsr()
+        row_of = np.repeat(np.arange(len(rows)), np.diff(similarity.indptr))
+        similarity.data = similarity.data / np.maximum(
+            self.norms[rows][row_of] * self.norms[similarity.indices], 1e-12)
+        similarity.data[similarity.indices == rows[row_of]] = 0
+        similarity.eliminate_zeros()
+
+        # Keep only each member's nearest neighbours
+        neighbor_rows, neighbor_cols, neighbor_sims = [], [], []
+        for i in range(len(rows)):
+            start, end = similarity.indptr[i], similarity.indptr[i + 1]
+            best = top_k(similarity.data[start:end], self.n_neighbors)
+            neighbor_rows.append(np.full(len(best), i))
+            neighbor_cols.append(similarity.indices[start:end][best])
+            neighbor_sims.append(similarity.data[start:end][best])
+        weights = sparse.csr_matrix(
+            (np.concatenate(neighbor_sims), (np.concatenate(neighbor_rows), np.concatenate(neighbor_cols))),
+            shape=similarity.shape)
+
+        scores = (weights @ self.matrix).tocsr()
+        scores = (scores - scores.multiply(users > 0)).tocsr()
+        scores.eliminate_zeros()
+
+        results = []
+        for i in range(len(rows)):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            best = top_k(scores.data[start:end], self.top_n)
+            cols = scores.indices[start:end][best]
+            results.append([(self.book_ids[c], float(s)) for c, s in zip(cols, scores.data[start:end][best])])
+        return results
+
+    def _content_chunk(self, rows):
+        counts = self.matrix[rows] @ self.column_to_catalog
+        return self.catalog.recommend(counts, self.top_n)
+
+
+_worker_scorer = None
+
+
+def _init_worker(scorer):
+    global _worker_scorer
+    _worker_scorer = scorer
+
+
+def _score_in_worker(rows):
+    return _worker_scorer.score_chunk(rows)
+
+
+def iter_recommendations(scorer, member_rows, chunk_size=1000, n_jobs=1):
+    """Yield one list of results per chunk of interaction rows, in order"""
+    chunks = [member_rows[i:i + chunk_size] for i in range(0, len(member_rows), chunk_size)]
+    if n_jobs <= 1:
+        for chunk in chunks:
+            yield scorer.score_chunk(chunk)
+        return
+
+    # Keep a bounded number of chunks in flight so results never pile up unread
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(scorer,)) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(_score_in_worker, chunk))
+            if len(in_flight) >= 2 * n_jobs:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
@@ -0,0 +1 @@
+"""Benchmarks for AIEngine and LibraryManager on synthetic libraries; run with python -m benchmarks"""
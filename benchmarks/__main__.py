@@ -0,0 +1,155 @@
+"""Run the benchmark suite and write the results as JSON
+
+    python -m benchmarks --sizes 10000 100000 1000000 --output bench.json
+
+Each size gets a fresh synthetic library in a scratch working directory, so
+the real library.db and artifacts/ are never touched.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_size(n_transactions, repeat, seed, only=None, indexes=False):
+    from models import Session, init_db
+    from library_manager import LibraryManager
+    from ai_engine import AIEngine
+    from benchmarks.synthetic import generate_library, populate_database
+    from benchmarks.scenarios import BenchContext, all_scenarios, measure
+
+    start = time.perf_counter()
+    library = generate_library(n_transactions, seed=seed)
+    generate_seconds = time.perf_counter() - start
+
+    init_db()
+    session = Session()
+    start = time.perf_counter()
+    populate_database(session, library)
+    populate_seconds = time.perf_counter() - start
+    session.close()
+
+    manager = LibraryManager()
+    # populate_database bypasses the write methods that maintain the dashboard counters
+    manager.reconcile_counters()
+    engine = AIEngine()
+    ctx = BenchContext(manager, engine, library)
+    results = []
+    for scenario in all_scenarios():
+        if only and not any(pattern in scenario.name for pattern in only):
+            continue
+        result = measure(scenario, ctx, repeat)
+        result.update(n_transactions=n_transactions, n_members=len(library.members),
+                      n_books=len(library.books))
+        results.append(result)
+        print(f"  {scenario.name:<45} cold {result['cold_seconds']:8.4f}s  "
+              f"warm {result['warm_seconds']:8.4f}s  peak {result['peak_mb']:8.1f} MB", flush=True)
+
+    index_comparison = None
+    if indexes:
+        from benchmarks.indexes import compare_indexes
+        index_comparison = compare_indexes(manager, library)
+        for name, query in index_comparison['queries'].items():
+            print(f"  index {name:<39} before {query['before_seconds']:8.4f}s  "
+                  f"after {query['after_seconds']:8.4f}s  x{query['speedup']:.1f}", flush=True)
+    manager.release_session()
+    return results, {'generate_seconds': generate_seconds, 'populate_seconds': populate_seconds}, index_comparison
+
+
+def scaling_curves(results):
+    """{scenario: [{n_transactions, warm_seconds, peak_mb}, ...]} sorted by size"""
+    curves = {}
+    for result in sorted(results, key=lambda r: r['n_transactions']):
+        curves.setdefault(result['scenario'], []).append({
+            'n_transactions': result['n_transactions'],
+            'warm_seconds': result['warm_seconds'],
+            'peak_mb': result['peak_mb']
+        })
+    return curves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AIEngine and LibraryManager on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="transaction counts to benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="calls per scenario (first one is cold)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help="run scenarios whose name contains any of these")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--skip-imports', action='store_true', help="skip the import/startup timings")
+    parser.add_argument('--indexes', action='store_true',
+                        help="also time the hot transaction queries before and after the index migration")
+    parser.add_argument('--concurrency', action='store_true',
+                        help="also run the concurrent checkout/return stress test")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    workdir = tempfile.mkdtemp(prefix='library-bench-')
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    try:
+        imports = startup = None
+        if not args.skip_imports:
+            from benchmarks.import_time import measure_imports, measure_startup
+            print("Import and startup times", flush=True)
+            imports = measure_imports(REPO_ROOT)
+            startup = measure_startup(REPO_ROOT)
+            for module, result in imports.items():
+                print(f"  import {module:<39} {result['total_ms']:8.1f} ms", flush=True)
+            for name, result in startup.items():
+                print(f"  {name:<46} {result['median_ms']:8.1f} ms", flush=True)
+        results, setup, index_comparisons = [], {}, []
+        for size in args.sizes:
+            print(f"{size} transactions", flush=True)
+            size_results, setup[size], index_comparison = run_size(size, args.repeat, args.seed, args.only,
+                                                                   args.indexes)
+            results.extend(size_results)
+            if index_comparison:
+                index_comparisons.append(index_comparison)
+        concurrency = None
+        if args.concurrency:
+            from benchmarks.concurrency import stress_checkout
+            print("Concurrent checkout/return stress test", flush=True)
+            start = time.perf_counter()
+            concurrency = stress_checkout(seed=args.seed)
+            concurrency['seconds'] = time.perf_counter() - start
+            print(f"  {concurrency['threads']} threads, no invariant violated "
+                  f"({concurrency['seconds']:.1f}s)", flush=True)
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    import numpy, pandas, sklearn
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': numpy.__version__,
+            'pandas': pandas.__version__,
+            'sklearn': sklearn.__version__,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'setup': setup
+        },
+        'imports': imports,
+        'startup': startup,
+        'index_comparison': index_comparisons,
+        'concurrency': concurrency,
+        'results': results,
+        'curves': scaling_curves(results)
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
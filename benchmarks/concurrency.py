@@ -0,0 +1,201 @@
+"""Concurrency stress test for checkout and return
+
+    python -m benchmarks.concurrency --threads 12
+
+Many threads, each with its own LibraryManager or all sharing one (each
+thread still gets its own session), race to borrow and return the same few
+books, one at a time and as carts. Afterwards the invariants are checked: no
+copy was ever oversold, no member went over the borrow limit, no loan was
+returned twice, and the open-loans counter matches the loans. Run it from a
+scratch working directory (python -m benchmarks does this) so library.db is
+not touched.
+"""
+
+import random
+import threading
+from collections import Counter
+
+
+def _reset(session, n_members, n_books, copies):
+    from models import Member, Book, Transaction, MemberStats, LibraryCounters
+
+    for model in (Transaction, MemberStats, Book, Member):
+        session.query(model).delete()
+    session.add_all(Member(id=i, name=f"Member {i}", email=f"member{i}@example.com")
+                    for i in range(1, n_members + 1))
+    session.add_all(Book(id=i, title=f"Book {i}", author="Author", genre="Fiction", isbn=f"stress-{i}",
+                         total_copies=copies, available_copies=copies, available=True)
+                    for i in range(1, n_books + 1))
+    session.merge(LibraryCounters(id=1, total_books=n_books, active_members=n_members, open_loans=0,
+                                  total_fines=0.0))
+    session.commit()
+
+
+def _race(n_threads, work, shared=None):
+    """Start n_threads threads on work(index, manager) together; returns results and errors
+
+    Each thread builds its own LibraryManager unless a shared one is given, as the
+    app shares one across all users.
+    """
+    from library_manager import LibraryManager
+
+    barrier = threading.Barrier(n_threads)
+    results, errors = [None] * n_threads, []
+
+    def run(index):
+        manager = shared
+        try:
+            manager = manager or LibraryManager()
+            barrier.wait()
+            results[index] = work(index, manager)
+        except Exception as e:
+            # A thread that never reaches the barrier must not leave the others waiting
+            barrier.abort()
+            errors.append(repr(e))
+        finally:
+            if manager is not None:
+                manager.release_session()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def check_invariants(session, max_per_member):
+    """Stock, loan and dashboard counter invariants that must hold whatever the interleaving"""
+    from models import Book, Transaction, LibraryCounters
+
+    open_loans = Counter(book_id for book_id, in session.query(Transaction.book_id).filter_by(status='borrowed'))
+    per_member = Counter(member_id for member_id, in
+                         session.query(Transaction.member_id).filter_by(status='borrowed'))
+    violations = []
+    for book in session.query(Book):
+        if book.available_copies < 0:
+            violations.append(f"book {book.id}: available_copies {book.available_copies}")
+        if book.available_copies + open_loans[book.id] != book.total_copies:
+            violations.append(f"book {book.id}: {book.available_copies} available + {open_loans[book.id]} "
+                              f"on loan != {book.total_copies} copies")
+        if book.available != (book.available_copies > 0):
+            violations.append(f"book {book.id}: available flag {book.available} with "
+                              f"{book.available_copies} copies")
+    violations.extend(f"member {member_id}: {count} open loans" for member_id, count in per_member.items()
+                      if count > max_per_member)
+    counters = session.get(LibraryCounters, 1)
+    if counters.open_loans != sum(open_loans.values()):
+        violations.append(f"open_loans counter {counters.open_loans} != {sum(open_loans.values())} open loans")
+    return violations
+
+
+def stress_checkout(n_threads=12, copies=5, operations=40, seed=0):
+    """Run the races and return a report; raises AssertionError on any violated invariant"""
+    from models import Session, init_db, Transaction
+    from library_manager import LibraryManager
+
+    init_db()
+    session = Session()
+    report = {'threads': n_threads, 'copies': copies}
+
+    # One hot book with fewer copies than borrowers
+    _reset(session, n_threads, 1, copies)
+    results, errors = _race(n_threads, lambda i, manager: manager.borrow_book(i + 1, 1)[0])
+    session.expire_all()
+    borrowed = sum(bool(ok) for ok in results)
+    report['hot_book'] = {'borrowed': borrowed, 'errors': errors, 'violations': check_invariants(session, 3)}
+    assert borrowed == copies, f"{borrowed} checkouts of {copies} copies"
+
+    # The same race through one manager shared by every thread
+    _reset(session, n_threads, 1, copies)
+    shared = LibraryManager()
+    results, errors = _race(n_threads, lambda i, manager: manager.borrow_book(i + 1, 1)[0], shared)
+    session.expire_all()
+    borrowed = sum(bool(ok) for ok in results)
+    report['hot_book_shared_manager'] = {'borrowed': borrowed, 'errors': errors,
+                                         'violations': check_invariants(session, 3)}
+    assert borrowed == copies, f"{borrowed} checkouts of {copies} copies through a shared manager"
+
+    # One member borrowing different books from every thread at once
+    _reset(session, 1, n_threads, copies)
+    results, errors = _race(n_threads, lambda i, manager: manager.borrow_book(1, i + 1)[0])
+    session.expire_all()
+    limit = sum(bool(ok) for ok in results)
+    report['borrow_limit'] = {'borrowed': limit, 'errors': errors, 'violations': check_invariants(session, 3)}
+    assert limit == 3, f"member holds {limit} books"
+
+    # Every thread returning the same loan
+    loan_id = session.query(Transaction.id).filter_by(status='borrowed').first()[0]
+    results, errors = _race(n_threads, lambda i, manager: manager.return_book(loan_id)[0])
+    session.expire_all()
+    returned = sum(bool(ok) for ok in results)
+    report['double_return'] = {'returned': returned, 'errors': errors,
+                               'violations': check_invariants(session, 3)}
+    assert returned == 1, f"loan returned {returned} times"
+
+    # Every member checking out a cart of the same three books, then returning the
+    # whole cart twice at once
+    _reset(session, n_threads, 3, copies)
+    results, errors = _race(n_threads, lambda i, manager: manager.borrow_books(
+        [(i + 1, 1), (i + 1, 2), (i + 1, 3)]), shared)
+    session.expire_all()
+    borrowed = sum(ok for cart in results if cart for ok, _ in cart)
+    violations = check_invariants(session, 3)
+    loans = [loan_id for loan_id, in session.query(Transaction.id).filter_by(status='borrowed')]
+    _, return_errors = _race(n_threads, lambda i, manager: manager.return_books(loans), shared)
+    session.expire_all()
+    returned = session.query(Transaction).filter_by(status='returned').count()
+    report['carts'] = {'borrowed': borrowed, 'returned': returned, 'errors': errors + return_errors,
+                       'violations': violations + check_invariants(session, 3)}
+    assert borrowed == 3 * copies, f"{borrowed} cart checkouts of {3 * copies} copies"
+    assert returned == borrowed, f"{returned} returns of {borrowed} loans"
+
+    # Random borrow/return churn on a few books
+    _reset(session, n_threads, 3, copies)
+
+    def churn(index, manager):
+        rng = random.Random(seed + index)
+        counts = Counter()
+        for _ in range(operations):
+            loan = manager.session.query(Transaction.id).filter_by(member_id=index + 1, status='borrowed').first()
+            if loan and rng.random() < 0.5:
+                counts['returned'] += manager.return_book(loan[0])[0]
+            else:
+                counts['borrowed'] += manager.borrow_book(index + 1, rng.randint(1, 3))[0]
+        return counts
+
+    results, errors = _race(n_threads, churn, shared)
+    session.expire_all()
+    totals = sum((counts for counts in results if counts), Counter())
+    report['churn'] = {'borrowed': totals['borrowed'], 'returned': totals['returned'], 'errors': errors,
+                       'violations': check_invariants(session, 3)}
+    session.close()
+
+    for name in ('hot_book', 'hot_book_shared_manager', 'borrow_limit', 'double_return', 'carts', 'churn'):
+        assert not report[name]['errors'], f"{name}: {report[name]['errors'][:3]}"
+        assert not report[name]['violations'], f"{name}: {report[name]['violations'][:3]}"
+    return report
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import json
+    import shutil
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Race concurrent checkouts/returns and check stock invariants")
+    parser.add_argument('--threads', type=int, default=12,
+                        help="concurrent threads; each holds a pooled connection")
+    parser.add_argument('--copies', type=int, default=5)
+    parser.add_argument('--operations', type=int, default=40, help="borrow/return calls per thread in churn")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    workdir = tempfile.mkdtemp(prefix='library-stress-')
+    os.chdir(workdir)
+    try:
+        print(json.dumps(stress_checkout(args.threads, args.copies, args.operations), indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
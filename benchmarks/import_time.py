@@ -0,0 +1,66 @@
+"""Cold-start cost: module import times and object construction in fresh interpreters"""
+
+import os
+import sys
+import subprocess
+import statistics
+
+MODULES = ['config', 'models', 'library_manager', 'ai_engine', 'model_trainer']
+STARTUP_SNIPPETS = {
+    'LibraryManager()': "from library_manager import LibraryManager; LibraryManager()",
+    'AIEngine()': "from ai_engine import AIEngine; AIEngine()",
+    'overview startup': ("from library_manager import LibraryManager; from ai_engine import AIEngine; "
+                         "m = LibraryManager(); AIEngine(); m.get_dashboard_stats()"),
+}
+
+
+def _python(code, repo_root, *flags):
+    env = dict(os.environ, PYTHONPATH=repo_root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.run([sys.executable, *flags, '-c', code], env=env, capture_output=True,
+                          text=True, check=True)
+
+
+def parse_importtime(stderr, module):
+    """Total cumulative import time of module and its slowest direct imports, in ms"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # Nested imports are indented two spaces per level after the first
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((depth, name.strip(), int(cumulative_us)))
+    # -X importtime lists a module's imports just before the module itself
+    total, children = 0, []
+    for i, (depth, name, cumulative) in enumerate(rows):
+        if depth == 0 and name == module:
+            total = cumulative
+            j = i - 1
+            while j >= 0 and rows[j][0] > 0:
+                if rows[j][0] == 1:
+                    children.append((rows[j][1], rows[j][2]))
+                j -= 1
+    children.sort(key=lambda item: -item[1])
+    return {'total_ms': total / 1e3, 'slowest_imports': [{'module': name, 'cumulative_ms': cumulative / 1e3}
+                                                        for name, cumulative in children[:10]]}
+
+
+def measure_imports(repo_root, modules=MODULES, repeat=3):
+    """Import time of each module in a fresh interpreter (median of repeat runs)"""
+    results = {}
+    for module in modules:
+        runs = [parse_importtime(_python(f"import {module}", repo_root, '-X', 'importtime').stderr, module)
+                for _ in range(repeat)]
+        median = statistics.median(run['total_ms'] for run in runs)
+        results[module] = min(runs, key=lambda run: abs(run['total_ms'] - median))
+    return results
+
+
+def measure_startup(repo_root, snippets=STARTUP_SNIPPETS, repeat=3):
+    """Wall time of each startup snippet, imports included, in a fresh interpreter"""
+    results = {}
+    for name, code in snippets.items():
+        timed = f"import time; _t = time.perf_counter(); {code}; print(time.perf_counter() - _t)"
+        runs = [float(_python(timed, repo_root).stdout.split()[-1]) for _ in range(repeat)]
+        results[name] = {'median_ms': statistics.median(runs) * 1e3, 'runs_ms': [r * 1e3 for r in runs]}
+    return results
@@ -0,0 +1,78 @@
+"""Before/after timings of the hot transaction queries around the index migration"""
+
+import time
+import statistics
+from sqlalchemy import text
+
+
+def _time(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+
+def hot_queries(manager, library):
+    """The access paths the indexes target, as the LibraryManager issues them"""
+    from models import Transaction
+    from benchmarks.synthetic import REFERENCE_DATE
+
+    member_ids = library.members['id'].sample(50, replace=True, random_state=0).tolist()
+    session = manager.session
+    return {
+        'open_loans_per_member': lambda: [
+            session.query(Transaction).filter_by(member_id=m, status='borrowed').count() for m in member_ids],
+        'dashboard_borrowed_count': lambda: session.query(Transaction).filter_by(status='borrowed').count(),
+        'overdue_transactions': lambda: manager.get_overdue_transactions(as_of=REFERENCE_DATE),
+    }
+
+
+QUERY_PLANS = {
+    'open_loans_per_member': "SELECT count(*) FROM transactions WHERE member_id = 1 AND status = 'borrowed'",
+    'dashboard_borrowed_count': "SELECT count(*) FROM transactions WHERE status = 'borrowed'",
+    'overdue_transactions': "SELECT * FROM transactions WHERE status = 'borrowed' AND due_date < '2024-01-01'",
+}
+
+
+def _plans(engine):
+    with engine.connect() as conn:
+        return {name: ' / '.join(str(row[-1]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+                for name, sql in QUERY_PLANS.items()}
+
+
+def compare_indexes(manager, library, repeat=5):
+    """Time the hot queries on a pre-migration schema, migrate in place, and time them again.
+
+    The database is first turned back into a pre-index one (indexes dropped, schema
+    version cleared), so the real migration path is what adds them back.
+    """
+    from models import engine
+    from migrations import migrate, MIGRATIONS, SCHEMA_VERSION_TABLE
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_transactions_member_status"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_transactions_status_due_date"))
+        conn.execute(text(f"DELETE FROM {SCHEMA_VERSION_TABLE} WHERE version >= :v"), {'v': MIGRATIONS[0][0]})
+
+    queries = hot_queries(manager, library)
+    before = {name: _time(fn, repeat) for name, fn in queries.items()}
+    plans_before = _plans(engine)
+
+    start = time.perf_counter()
+    applied = migrate(engine)
+    migrate_seconds = time.perf_counter() - start
+
+    after = {name: _time(fn, repeat) for name, fn in queries.items()}
+    plans_after = _plans(engine)
+
+    return {
+        'n_transactions': len(library.transactions),
+        'migrations_applied': applied,
+        'migrate_seconds': migrate_seconds,
+        'queries': {name: {'before_seconds': before[name], 'after_seconds': after[name],
+                           'speedup': before[name] / after[name] if after[name] else None,
+                           'plan_before': plans_before[name], 'plan_after': plans_after[name]}
+                    for name in queries}
+    }
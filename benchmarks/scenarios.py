@@ -0,0 +1,221 @@
+"""Timed benchmark scenarios covering the public AIEngine and LibraryManager API"""
+
+import gc
+import csv
+import time
+import statistics
+import tracemalloc
+from typing import NamedTuple, Callable
+
+from benchmarks.synthetic import REFERENCE_DATE
+
+
+class Scenario(NamedTuple):
+    name: str
+    run: Callable
+    repeat: int = None  # overrides the runner's repeat count, e.g. for slow fits
+    setup: Callable = None  # untimed; run is called as run(ctx, setup(ctx)) before each timing
+
+
+class BenchContext:
+    """Everything the scenarios need: a populated manager, an engine and frames"""
+
+    def __init__(self, manager, engine, library):
+        self.manager = manager
+        self.engine = engine
+        self.members = manager.get_all_members()
+        self.books = manager.get_all_books()
+        self.transactions = manager.get_all_transactions()
+        self.member_stats = manager.get_member_stats()
+        self.library = library
+
+        counts = self.transactions['member_id'].value_counts()
+        self.member_id = int(counts.index[len(counts) // 2])  # a typical, not the busiest, member
+        self.member_transactions = self.transactions[self.transactions['member_id'] == self.member_id]
+        self.book_id = int(self.transactions['book_id'].value_counts().index[0])
+        self.open_loans = self.transactions[self.transactions['status'] == 'borrowed']
+        self._returnable = self.open_loans['id'].tolist()
+        idle = self.members[self.members['is_active'] & ~self.members['id'].isin(self.open_loans['member_id'])]
+        on_shelf = self.books[self.books['available_copies'] > 0]
+        self._borrowable = list(zip(idle['id'].tolist(), on_shelf['id'].tolist()))
+        self._counter = 0
+
+    def next_open_loan(self):
+        return int(self._returnable.pop())
+
+    def next_borrow(self):
+        """A (member_id, book_id) pair that borrow_book will accept"""
+        member_id, book_id = self._borrowable.pop()
+        return int(member_id), int(book_id)
+
+    def next_cart(self, size=3):
+        """An idle member and size on-shelf books: a cart borrow_books will accept"""
+        pairs = [self.next_borrow() for _ in range(size)]
+        return [(pairs[0][0], book_id) for _, book_id in pairs]
+
+    def next_open_loans(self, size=8):
+        return [self.next_open_loan() for _ in range(size)]
+
+    def unique(self, prefix):
+        self._counter += 1
+        return f"{prefix}{self._counter}"
+
+    def import_rows(self, kind, n):
+        """n new, valid (line number, record) pairs for LibraryManager.import_records"""
+        start, self._counter = self._counter, self._counter + n
+        if kind == 'books':
+            records = ({'title': f"Imported Book {i}", 'author': f"Import Author {i % 500}", 'genre': 'Technology',
+                        'isbn': _isbn13(i), 'copies': 2} for i in range(start, start + n))
+        else:
+            records = ({'name': f"Imported Member {i}", 'email': f"import{i}@example.com"}
+                       for i in range(start, start + n))
+        return list(enumerate(records, 1))
+
+    def import_csv(self, kind, n):
+        """Write n new, valid rows to a CSV in the (scratch) working directory; returns its path"""
+        path = f"bench_import_{kind}.csv"
+        rows = [record for _, record in self.import_rows(kind, n)]
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+
+def _isbn13(n):
+    """A valid ISBN-13 in the 979 range, which the synthetic catalog does not use"""
+    digits = f"979{n:09d}"
+    return digits + str(-(sum(map(int, digits[0::2])) + 3 * sum(map(int, digits[1::2]))) % 10)
+
+
+def _uncached(run):
+    """Clear the engine's result cache first, so the computation is timed, not a hit"""
+    def uncached_run(ctx):
+        ctx.engine.result_cache.clear()
+        return run(ctx)
+    return uncached_run
+
+
+def _engine_scenarios():
+    return [
+        Scenario('engine.collaborative_filtering', _uncached(lambda c: c.engine.collaborative_filtering(
+            c.transactions, c.member_id))),
+        Scenario('engine.collaborative_filtering[cached]', lambda c: c.engine.collaborative_filtering(
+            c.transactions, c.member_id)),
+        Scenario('engine.collaborative_filtering[als]', _uncached(lambda c: c.engine.collaborative_filtering(
+            c.transactions, c.member_id, method='als'))),
+        Scenario('engine.als_filtering', lambda c: c.engine.als_filtering(c.transactions, c.member_id)),
+        Scenario('engine.item_based_filtering', lambda c: c.engine.item_based_filtering(
+            c.transactions, c.member_id)),
+        Scenario('engine.similar_books', lambda c: c.engine.similar_books(c.transactions, c.book_id)),
+        Scenario('engine.content_based_filtering', _uncached(lambda c: c.engine.content_based_filtering(
+            c.books, c.member_transactions))),
+        Scenario('engine.content_based_filtering[by_member]', lambda c: c.engine.content_based_filtering(
+            c.books, c.transactions, by_member=True), repeat=1),
+        Scenario('engine.batch_recommend[collaborative]', lambda c: sum(len(chunk) for chunk in
+                 c.engine.batch_recommend(c.transactions, c.books)), repeat=1),
+        Scenario('engine.batch_recommend[content]', lambda c: sum(len(chunk) for chunk in
+                 c.engine.batch_recommend(c.transactions, c.books, method='content')), repeat=1),
+        Scenario('engine.member_features', lambda c: c.engine.member_features(
+            c.members, c.transactions, c.member_stats)),
+        Scenario('engine.cluster_members', lambda c: c.engine.cluster_members(
+            c.members, c.transactions, member_stats=c.member_stats)),
+        Scenario('engine.assign_clusters', lambda c: c.engine.assign_clusters(
+            c.engine.member_features(c.members, c.transactions, c.member_stats).values)),
+        Scenario('engine.train_late_predictor', lambda c: c.engine.train_late_predictor(
+            c.transactions, force=True, member_stats=c.member_stats), repeat=1),
+        Scenario('engine.retrain', lambda c: c.engine.retrain(
+            c.members, c.transactions, c.member_stats), repeat=1),
+        Scenario('engine.predict_late_return', lambda c: c.engine.predict_late_return(
+            c.member_id, 14, c.transactions, c.member_stats)),
+        Scenario('engine.predict_late_returns', lambda c: c.engine.predict_late_returns(
+            c.transactions, member_stats=c.member_stats)),
+        Scenario('engine.nlp_search[tfidf]', _uncached(lambda c: c.engine.nlp_search(
+            'pragmatic programmer', c.books))),
+        Scenario('engine.nlp_search[fuzzy]', _uncached(lambda c: c.engine.nlp_search(
+            'pragmatik programer', c.books, mode='fuzzy'))),
+        Scenario('engine.nlp_search[semantic]', _uncached(lambda c: c.engine.nlp_search(
+            'stories about the ocean', c.books, mode='semantic'))),
+        Scenario('engine.semantic_search[batch]', lambda c: c.engine.semantic_search(
+            ['ancient empire history', 'modern code design', 'secret garden'], c.books)),
+        Scenario('engine.search_books', lambda c: c.engine.search_books(
+            'hidden', c.books, genre=c.books['genre'].iloc[0], available_only=True)),
+        Scenario('engine.autocomplete', lambda c: c.engine.autocomplete('the pra', c.books)),
+    ]
+
+
+def _manager_scenarios():
+    return [
+        Scenario('manager.get_all_members', lambda c: c.manager.get_all_members()),
+        Scenario('manager.get_all_books', lambda c: c.manager.get_all_books()),
+        Scenario('manager.get_all_transactions', lambda c: c.manager.get_all_transactions()),
+        Scenario('manager.get_member_stats', lambda c: c.manager.get_member_stats()),
+        Scenario('manager.get_dashboard_stats', lambda c: c.manager.get_dashboard_stats()),
+        Scenario('manager.get_overdue_transactions', lambda c: c.manager.get_overdue_transactions(
+            as_of=REFERENCE_DATE)),
+        Scenario('manager.check_counters', lambda c: c.manager.check_counters()),
+        Scenario('manager.reconcile_counters', lambda c: c.manager.reconcile_counters()),
+        Scenario('manager.rebuild_member_stats', lambda c: c.manager.rebuild_member_stats(), repeat=1),
+        Scenario('manager.add_member', lambda c: c.manager.add_member(
+            'Bench Member', c.unique('bench') + '@example.com')),
+        Scenario('manager.add_book', lambda c: c.manager.add_book(
+            'Benchmark Book', 'Bench Author', 'Technology', c.unique('bench-isbn-'))),
+        # Rows per second = 10000 / warm_seconds
+        Scenario('manager.import_records[books, 10k rows]', lambda c, rows: c.manager.import_records(
+            'books', rows), setup=lambda c: c.import_rows('books', 10000)),
+        Scenario('manager.import_file[members csv, 10k rows]', lambda c, path: c.manager.import_file(
+            'members', path), setup=lambda c: c.import_csv('members', 10000)),
+        Scenario('manager.return_book', lambda c: c.manager.return_book(c.next_open_loan())),
+        Scenario('manager.borrow_book', lambda c: c.manager.borrow_book(*c.next_borrow())),
+        Scenario('manager.return_books (8 loans)', lambda c: c.manager.return_books(c.next_open_loans(8))),
+        Scenario('manager.borrow_books (3-book cart)', lambda c: c.manager.borrow_books(c.next_cart(3))),
+    ]
+
+
+def all_scenarios():
+    """Read-only engine scenarios first, then the manager ones (some of which write)"""
+    return _engine_scenarios() + _manager_scenarios()
+
+
+def measure(scenario, ctx, repeat=3):
+    """Time one scenario: a cold first call, warm repeats, and peak traced memory.
+
+    Peak memory is measured with tracemalloc on an extra call, so the timings
+    are not slowed down by tracing.
+    """
+    repeat = scenario.repeat or repeat
+
+    def prepare():
+        if scenario.setup is None:
+            return lambda: scenario.run(ctx)
+        prepared = scenario.setup(ctx)
+        return lambda: scenario.run(ctx, prepared)
+
+    run = prepare()
+    gc.collect()
+    start = time.perf_counter()
+    run()
+    cold = time.perf_counter() - start
+
+    warm = []
+    for _ in range(repeat - 1):
+        run = prepare()
+        start = time.perf_counter()
+        run()
+        warm.append(time.perf_counter() - start)
+
+    run = prepare()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'scenario': scenario.name,
+        'cold_seconds': cold,
+        'warm_seconds': statistics.median(warm) if warm else cold,
+        'repeat': repeat,
+        'peak_mb': peak / 2 ** 20
+    }
@@ -0,0 +1,164 @@
+"""Deterministic synthetic library data at any scale"""
+
+from datetime import datetime, timedelta
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+import config
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Emma', 'Frank', 'Grace', 'Henry', 'Isla', 'Jack',
+               'Kara', 'Liam', 'Maya', 'Noah', 'Olivia', 'Paul', 'Quinn', 'Rosa', 'Sam', 'Tara']
+LAST_NAMES = ['Smith', 'Johnson', 'Brown', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson', 'Moore',
+              'Taylor', 'Clark', 'Lewis', 'Walker', 'Young', 'King', 'Wright', 'Hill', 'Green']
+TITLE_ADJECTIVES = ['Silent', 'Hidden', 'Last', 'Lost', 'Broken', 'Golden', 'Quiet', 'Pragmatic',
+                    'Modern', 'Ancient', 'Clean', 'Deep', 'Secret', 'Endless', 'Practical', 'Dark']
+TITLE_NOUNS = ['Garden', 'Empire', 'Algorithm', 'River', 'Mind', 'Code', 'Kingdom', 'Machine',
+               'History', 'Ocean', 'Design', 'Habit', 'Star', 'City', 'Programmer', 'Forest']
+REFERENCE_DATE = datetime(2024, 1, 1)
+
+
+class SyntheticLibrary(NamedTuple):
+    """Frames shaped like LibraryManager.get_all_members/books/transactions"""
+    members: pd.DataFrame
+    books: pd.DataFrame
+    transactions: pd.DataFrame
+
+
+def zipf_weights(n, exponent, rng=None):
+    """Normalised 1/rank**exponent weights, shuffled when rng is given"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    if rng is not None:
+        rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _names(rng, n):
+    return [f"{FIRST_NAMES[a]} {LAST_NAMES[b]}" for a, b in
+            zip(rng.integers(0, len(FIRST_NAMES), n), rng.integers(0, len(LAST_NAMES), n))]
+
+
+def generate_books(n_books, rng):
+    """Books whose genres and authors follow long-tailed popularity"""
+    genre_weights = zipf_weights(len(config.GENRES), 1.1, rng)
+    n_authors = max(5, n_books // 8)
+    author_names = _names(rng, n_authors)
+    author_genres = rng.choice(len(config.GENRES), size=n_authors, p=genre_weights)
+
+    authors = rng.choice(n_authors, size=n_books, p=zipf_weights(n_authors, 1.2, rng))
+    # Most authors stay in their home genre
+    genres = np.where(rng.random(n_books) < 0.8, author_genres[authors],
+                      rng.choice(len(config.GENRES), size=n_books, p=genre_weights))
+    adjectives = rng.integers(0, len(TITLE_ADJECTIVES), n_books)
+    nouns = rng.integers(0, len(TITLE_NOUNS), n_books)
+    copies = 1 + rng.poisson(1.0, n_books)
+
+    return pd.DataFrame({
+        'id': np.arange(1, n_books + 1),
+        'title': [f"The {TITLE_ADJECTIVES[a]} {TITLE_NOUNS[b]}" + (f" {i // 256 + 1}" if i >= 256 else '')
+                  for i, (a, b) in enumerate(zip(adjectives, nouns))],
+        'author': [author_names[a] for a in authors],
+        'genre': [config.GENRES[g] for g in genres],
+        'isbn': [f"978{i:010d}" for i in range(1, n_books + 1)],
+        'total_copies': copies,
+        'available_copies': copies,
+        'available': True
+    })
+
+
+def generate_members(n_members, rng):
+    join_days = rng.integers(0, 3 * 365, n_members)
+    return pd.DataFrame({
+        'id': np.arange(1, n_members + 1),
+        'name': _names(rng, n_members),
+        'email': [f"member{i}@example.com" for i in range(1, n_members + 1)],
+        'join_date': [REFERENCE_DATE - timedelta(days=int(d)) for d in join_days],
+        'total_fines': 0.0,
+        'is_active': rng.random(n_members) < 0.97
+    })
+
+
+def generate_transactions(n_transactions, members, books, rng, open_loans=0.05, genre_affinity=0.6):
+    """Borrow/return history over the year before REFERENCE_DATE.
+
+    Member activity is log-normal, book popularity Zipf-like, and most borrows
+    fall in the member's favourite genre. Each member has a fixed late-return
+    propensity; fines follow the LibraryManager rule.
+    """
+    n_members, n_books = len(members), len(books)
+    activity = rng.lognormal(0.0, 1.0, n_members)
+    member_pos = rng.choice(n_members, size=n_transactions, p=activity / activity.sum())
+
+    popularity = zipf_weights(n_books, 0.9, rng)
+    book_pos = rng.choice(n_books, size=n_transactions, p=popularity)
+    genre_codes, genre_names = pd.factorize(books['genre'])
+    favourite = rng.integers(0, len(genre_names), n_members)
+    affine = np.flatnonzero(rng.random(n_transactions) < genre_affinity)
+    for code in range(len(genre_names)):
+        in_genre = np.flatnonzero(genre_codes == code)
+        picks = affine[favourite[member_pos[affine]] == code]
+        if len(in_genre) and len(picks):
+            weights = popularity[in_genre] / popularity[in_genre].sum()
+            book_pos[picks] = in_genre[rng.choice(len(in_genre), size=len(picks), p=weights)]
+
+    borrow_offsets = np.sort(rng.uniform(0, 365, n_transactions))
+    borrow_dates = pd.Timestamp(REFERENCE_DATE) - pd.to_timedelta(365 - borrow_offsets, unit='D')
+    due_dates = borrow_dates + pd.Timedelta(days=config.MAX_BORROW_DAYS)
+
+    late_propensity = rng.beta(1.0, 6.0, n_members)
+    late = rng.random(n_transactions) < late_propensity[member_pos]
+    return_dates = pd.Series(np.where(
+        late,
+        due_dates + pd.to_timedelta(rng.integers(1, 21, n_transactions), unit='D'),
+        borrow_dates + pd.to_timedelta(rng.integers(1, config.MAX_BORROW_DAYS, n_transactions), unit='D')))
+    # The most recent loans are still out
+    is_open = np.arange(n_transactions) >= n_transactions - int(n_transactions * open_loans)
+    fines = np.where(late & ~is_open,
+                     (return_dates - due_dates).dt.days.to_numpy() * config.FINE_PER_DAY, 0.0)
+
+    return pd.DataFrame({
+        'id': np.arange(1, n_transactions + 1),
+        'member_id': members['id'].to_numpy()[member_pos],
+        'book_id': books['id'].to_numpy()[book_pos],
+        'borrow_date': borrow_dates,
+        'due_date': due_dates,
+        'return_date': return_dates.where(~is_open, pd.NaT),
+        'fine': fines,
+        'status': np.where(is_open, 'borrowed', 'returned')
+    })
+
+
+def generate_library(n_transactions, n_members=None, n_books=None, seed=0):
+    """Members, books and transactions for a library with n_transactions loans.
+
+    Defaults to one member per 20 loans and one book per 10; the same arguments
+    always produce the same data.
+    """
+    rng = np.random.default_rng(seed)
+    n_members = n_members or max(10, n_transactions // 20)
+    n_books = n_books or max(10, n_transactions // 10)
+    members = generate_members(n_members, rng)
+    books = generate_books(n_books, rng)
+    transactions = generate_transactions(n_transactions, members, books, rng)
+
+    fines = transactions.groupby('member_id')['fine'].sum()
+    members['total_fines'] = members['id'].map(fines).fillna(0.0)
+    out = transactions[transactions['status'] == 'borrowed'].groupby('book_id').size()
+    out = books['id'].map(out).fillna(0).astype(int)
+    books['total_copies'] = np.maximum(books['total_copies'], out)
+    books['available_copies'] = books['total_copies'] - out
+    books['available'] = books['available_copies'] > 0
+    return SyntheticLibrary(members, books, transactions)
+
+
+def populate_database(session, library):
+    """Replace the contents of the library tables with a SyntheticLibrary"""
+    from models import Member, Book, Transaction, MemberStats
+
+    for model in (MemberStats, Transaction, Book, Member):
+        session.query(model).delete()
+    for model, frame in ((Member, library.members), (Book, library.books),
+                         (Transaction, library.transactions)):
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        for start in range(0, len(records), 50000):
+            session.bulk_insert_mappings(model, records[start:start + 50000])
+    session.commit()
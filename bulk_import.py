@@ -0,0 +1,269 @@
+"""Streaming bulk import of books and members from CSV or JSONL
+
+Usage:
+    python bulk_import.py books catalog.csv
+    python bulk_import.py members members.jsonl --batch-size 10000 --rejects bad_members.jsonl
+
+Rows are read lazily, validated, deduplicated (ISBNs and emails, against each
+other and the database) and inserted in batches, one transaction per batch.
+Invalid and duplicate rows go to a rejects file next to the input (same
+format, plus line number and reason) instead of stopping the load.
+"""
+
+import os
+import re
+import csv
+import json
+import time
+from itertools import islice
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+
+from models import Book, Member, bump_counters
+from instrumentation import metrics
+
+BATCH_SIZE = 5000
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class Rejected(ValueError):
+    """A row that fails validation; the message is its reason"""
+
+
+def normalize_isbn(isbn):
+    """Digits (and a trailing X) of an ISBN-10/13 with a valid check digit, else raise Rejected"""
+    digits = re.sub(r"[\s-]", "", isbn).upper()
+    if len(digits) == 13 and digits.isdigit():
+        valid = (sum(map(int, digits[0::2])) + 3 * sum(map(int, digits[1::2]))) % 10 == 0
+    elif len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] == 'X'):
+        check = 10 if digits[9] == 'X' else int(digits[9])
+        valid = (sum(w * int(c) for w, c in zip(range(10, 1, -1), digits)) + check) % 11 == 0
+    else:
+        raise Rejected(f"malformed isbn {isbn!r}")
+    if not valid:
+        raise Rejected(f"bad isbn check digit {isbn!r}")
+    return digits
+
+
+def _required(record, field):
+    value = str(record.get(field) or '').strip()
+    if not value:
+        raise Rejected(f"missing {field}")
+    return value
+
+
+def validate_book(record):
+    """(dedupe key, row for the books table) from an input record; raises Rejected"""
+    row = {field: _required(record, field) for field in ('title', 'author', 'genre')}
+    copies = record.get('copies', record.get('total_copies')) or 1
+    try:
+        copies = int(copies)
+    except (TypeError, ValueError):
+        raise Rejected(f"copies is not a number: {copies!r}")
+    if copies < 1:
+        raise Rejected(f"copies must be at least 1, got {copies}")
+    isbn = str(record.get('isbn') or '').strip() or None
+    row.update(isbn=isbn, total_copies=copies, available_copies=copies, available=True)
+    return (normalize_isbn(isbn) if isbn else None), row
+
+
+def validate_member(record):
+    """(dedupe key, row for the members table) from an input record; raises Rejected"""
+    name, email = _required(record, 'name'), _required(record, 'email')
+    if not EMAIL_PATTERN.match(email):
+        raise Rejected(f"invalid email {email!r}")
+    return email.lower(), {'name': name, 'email': email}
+
+
+# kind -> (model, validate, unique column, normaliser for existing values, columns returned per inserted row,
+#          dashboard counter)
+KINDS = {
+    'books': (Book, validate_book, Book.isbn, normalize_isbn, ('id', 'title', 'author', 'genre'), 'total_books'),
+    'members': (Member, validate_member, Member.email, str.lower, ('id',), 'active_members'),
+}
+
+
+def detect_format(path):
+    return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def read_records(path, fmt=None):
+    """Yield (line number, record dict or Rejected) for each row, without loading the file"""
+    fmt = fmt or detect_format(path)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, Rejected(f"invalid json: {e.msg}")
+                    continue
+                yield number, record if isinstance(record, dict) else Rejected("not a json object")
+
+
+class RejectWriter:
+    """Writes rejected rows, in the input's format plus line and reason, to a file opened on first use"""
+
+    def __init__(self, path, fmt):
+        self.path, self.fmt = path, fmt
+        self.count = 0
+        self._file = self._writer = None
+
+    def write(self, number, record, reason):
+        self.count += 1
+        if self.path is None:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        if self.fmt == 'csv':
+            # DictReader puts surplus fields under None
+            row = {key: value for key, value in (record or {}).items() if key is not None}
+            row.update(line=number, reason=reason)
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._file, fieldnames=list(row), extrasaction='ignore')
+                self._writer.writeheader()
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(dict(record or {}, _line=number, _reason=reason), default=str) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _existing_keys(session, column, normalise):
+    keys = set()
+    for (value,) in session.execute(select(column).where(column.isnot(None))).yield_per(BATCH_SIZE):
+        try:
+            keys.add(normalise(value))
+        except Rejected:
+            keys.add(value)
+    return keys
+
+
+def _insert_batch(session, table, returned, counter, batch, rejects):
+    """Insert one batch in a transaction; returns the returned columns of the inserted rows.
+
+    The Core insert runs as multi-row INSERT ... VALUES statements. RETURNING
+    carries the payload columns, so the unordered result needs no matching up.
+    A batch that hits a unique constraint (a concurrent writer got there first)
+    is redone row by row so only the conflicting rows are rejected.
+    """
+    statement = insert(table).returning(*(table.c[name] for name in returned))
+    try:
+        inserted = session.execute(statement, [row for _, _, row in batch]).mappings().all()
+        bump_counters(session, **{counter: len(inserted)})
+        session.commit()
+        return inserted
+    except IntegrityError:
+        session.rollback()
+    inserted = []
+    for number, record, row in batch:
+        try:
+            with session.begin_nested():
+                inserted.extend(session.execute(statement, [row]).mappings().all())
+        except IntegrityError as e:
+            rejects.write(number, record, f"conflicts with existing row: {e.orig}")
+    bump_counters(session, **{counter: len(inserted)})
+    session.commit()
+    return inserted
+
+
+def import_records(kind, records, manager, batch_size=BATCH_SIZE, rejects=None, on_batch=None, notify=None):
+    """Validate, dedupe and insert (line number, record) pairs in batches through manager's session.
+
+    Returns a summary with per-batch throughput; on_batch(stats) is called after
+    each batch. notify(event, payload) gets one books_added event per batch of
+    imported books (LibraryManager passes its listeners' dispatcher).
+    """
+    model, validate, unique_column, normalise, returned, counter = KINDS[kind]
+    rejects = rejects or RejectWriter(None, None)
+    session = manager.session
+    seen = _existing_keys(session, unique_column, normalise)
+    batches, total_rows, total_inserted = [], 0, 0
+    start = time.perf_counter()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        batch_start = time.perf_counter()
+        rejected_before = rejects.count
+        batch = []
+        for number, record in chunk:
+            try:
+                if isinstance(record, Rejected):
+                    raise record
+                key, row = validate(record)
+                if key is not None:
+                    if key in seen:
+                        raise Rejected(f"duplicate {unique_column.key} {row[unique_column.key]!r}")
+                    seen.add(key)
+                batch.append((number, record, row))
+            except Rejected as e:
+                rejects.write(number, None if isinstance(record, Rejected) else record, str(e))
+        inserted = _insert_batch(session, model.__table__, returned, counter, batch, rejects) if batch else []
+        if inserted and kind == 'books' and notify is not None:
+            notify('books_added', [dict(row) for row in inserted])
+        seconds = time.perf_counter() - batch_start
+        metrics.record(f"import.{kind} batch", seconds, rows=len(chunk))
+        stats = {'batch': len(batches) + 1, 'rows': len(chunk), 'inserted': len(inserted),
+                 'rejected': rejects.count - rejected_before, 'seconds': seconds,
+                 'rows_per_second': len(chunk) / seconds if seconds else None}
+        batches.append(stats)
+        total_rows += len(chunk)
+        total_inserted += len(inserted)
+        if on_batch is not None:
+            on_batch(stats)
+    seconds = time.perf_counter() - start
+    manager.release_session()
+    return {'kind': kind, 'rows': total_rows, 'inserted': total_inserted, 'rejected': rejects.count,
+            'seconds': seconds, 'rows_per_second': total_rows / seconds if seconds else None,
+            'rejects_path': rejects.path if rejects.count else None, 'batches': batches}
+
+
+def default_rejects_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}.rejects{ext}"
+
+
+def import_file(kind, path, manager, fmt=None, batch_size=BATCH_SIZE, rejects_path=None, on_batch=None,
+                notify=None):
+    """Stream a CSV/JSONL file into the books or members table; see import_records"""
+    fmt = fmt or detect_format(path)
+    rejects = RejectWriter(rejects_path or default_rejects_path(path), fmt)
+    try:
+        return import_records(kind, read_records(path, fmt), manager, batch_size, rejects, on_batch, notify)
+    finally:
+        rejects.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    from library_manager import LibraryManager
+
+    parser = argparse.ArgumentParser(description="Bulk import books or members from CSV/JSONL")
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="default: from the file extension")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--rejects', help="rejected rows file (default: <input>.rejects.<ext>)")
+    args = parser.parse_args()
+
+    def progress(stats):
+        print(f"  batch {stats['batch']:>5}: {stats['inserted']:>7} inserted  {stats['rejected']:>6} rejected  "
+              f"{stats['rows_per_second'] or 0:>10,.0f} rows/s", flush=True)
+
+    report = LibraryManager().import_file(args.kind, args.path, fmt=args.format, batch_size=args.batch_size,
+                                          rejects_path=args.rejects, on_batch=progress)
+    print(f"Imported {report['inserted']} of {report['rows']} {args.kind} in {report['seconds']:.1f}s "
+          f"({report['rows_per_second'] or 0:,.0f} rows/s)")
+    if report['rejected']:
+        print(f"{report['rejected']} rejected rows written to {report['rejects_path']}")
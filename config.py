@@ -1,5 +1,7 @@
 """Configuration settings for the library system"""
 
+import os
+
 # Library Settings
 FINE_PER_DAY = 2.0
 MAX_BORROW_DAYS = 14
@@ -9,9 +11,38 @@ MAX_BOOKS_PER_MEMBER = 3
 N_CLUSTERS = 4
 RECOMMENDATION_COUNT = 5
 LATE_PREDICTION_THRESHOLD = 0.7
+RETRAIN_INTERVAL_SECONDS = 3600
+RETRAIN_AFTER_TRANSACTIONS = 50
+ARTIFACT_DIR = 'artifacts'
+ARTIFACT_VERSIONS_KEPT = 3
+EMBEDDING_MODEL_DIR = None  # local Sentence Transformers model directory, e.g. 'models/all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+EMBEDDING_CACHE_DIR = 'artifacts/embeddings'
+ITEM_NEIGHBORS_K = 20
+ITEM_NEIGHBORS_REFRESH = 100
+ALS_FACTORS = 32
+ALS_ITERATIONS = 10
+ALS_REGULARIZATION = 0.1
+ALS_ALPHA = 10.0
+ALS_REFRESH = 500  # borrows folded in before the factors are refitted
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL_SECONDS = 600  # None keeps entries until evicted or invalidated
+INSTRUMENTATION_ENABLED = True  # call/SQL timings shown under Settings > Diagnostics
 
 # Database
-DATABASE_URL = 'sqlite:///library.db'
+DATABASE_URL = os.environ.get('LIBRARY_DATABASE_URL', 'sqlite:///library.db')  # any SQLAlchemy URL, e.g. postgresql+psycopg2://...
+DB_POOL_SIZE = 10  # connections kept open per process
+DB_MAX_OVERFLOW = 20  # extra connections allowed under bursts
+DB_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+DB_POOL_RECYCLE = 1800  # seconds before a server connection is replaced (not SQLite)
+COUNTER_RECONCILE_INTERVAL_SECONDS = 900  # how often the dashboard counters are checked against the tables
+SQLITE_BUSY_TIMEOUT_MS = 5000  # how long a writer waits for the lock before "database is locked"
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers no longer block on the writer
+    'synchronous': 'NORMAL',  # durable at checkpoints; safe with WAL
+    'cache_size': -64000,  # page cache in KiB (negative) per connection
+    'mmap_size': 268435456,  # 256 MB of the file read through mmap
+}
 
 # UI Settings
 PAGE_TITLE = "AI Library System"
@@ -0,0 +1,116 @@
+"""Categorical genre/author encoding of the catalog for content-based scoring"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from search_index import top_k
+
+GENRE_WEIGHT = 2
+AUTHOR_WEIGHT = 1
+
+
+class CatalogEncoding:
+    """Genre and author codes for every book, built once and extended as books are added.
+
+    Member preferences are count vectors over the catalog positions of the books
+    they borrowed; scoring a batch of members is two sparse products.
+    """
+
+    def __init__(self):
+        self.ids = np.array([], dtype=np.int64)
+        self.genre_codes = np.array([], dtype=np.int64)
+        self.author_codes = np.array([], dtype=np.int64)
+        self.genre_index = {}
+        self.author_index = {}
+        self._id_index = None
+        self._one_hot = None
+        self._masks = {}
+
+    @property
+    def size(self):
+        return len(self.ids)
+
+    def build(self, books_df):
+        """Encode the whole catalog"""
+        self.__init__()
+        self.ids = books_df['id'].to_numpy(dtype=np.int64)
+        self.genre_codes, genres = pd.factorize(books_df['genre'])
+        self.author_codes, authors = pd.factorize(books_df['author'])
+        self.genre_index = {g: i for i, g in enumerate(genres)}
+        self.author_index = {a: i for i, a in enumerate(authors)}
+        return self
+
+    def matches(self, books_df):
+        """Check whether the encoding covers exactly the books in books_df"""
+        return len(books_df) == self.size and np.array_equal(books_df['id'].to_numpy(dtype=np.int64), self.ids)
+
+    def add_books(self, books):
+        """Append books (dicts with id, author, genre) to the encoding"""
+        if not books:
+            return
+        genre_codes = [self.genre_index.setdefault(b['genre'], len(self.genre_index)) for b in books]
+        author_codes = [self.author_index.setdefault(b['author'], len(self.author_index)) for b in books]
+        self.ids = np.concatenate([self.ids, np.array([b['id'] for b in books], dtype=np.int64)])
+        self.genre_codes = np.concatenate([self.genre_codes, genre_codes])
+        self.author_codes = np.concatenate([self.author_codes, author_codes])
+        self._id_index = None
+        self._one_hot = None
+        self._masks = {}
+
+    def positions(self, book_ids):
+        """Catalog positions of book_ids, -1 for books not in the catalog"""
+        if self._id_index is None:
+            self._id_index = pd.Index(self.ids)
+        return self._id_index.get_indexer(np.asarray(book_ids))
+
+    def _genre_author_matrices(self):
+        if self._one_hot is None:
+            rows = np.arange(self.size)
+            ones = np.ones(self.size)
+            genres = sparse.csr_matrix((ones, (rows, self.genre_codes)), shape=(self.size, len(self.genre_index)))
+            authors = sparse.csr_matrix((ones, (rows, self.author_codes)), shape=(self.size, len(self.author_index)))
+            self._one_hot = (genres, authors)
+        return self._one_hot
+
+    def genre_mask(self, genre):
+        """Cached boolean mask of the books in a genre, ignoring case and surrounding spaces"""
+        return self._mask('genre', genre, self.genre_index, self.genre_codes)
+
+    def author_mask(self, author):
+        """Cached boolean mask of the books by an author, ignoring case and surrounding spaces"""
+        return self._mask('author', author, self.author_index, self.author_codes)
+
+    def _mask(self, kind, value, index, codes):
+        key = (kind, str(value).strip().casefold())
+        if key not in self._masks:
+            matching = [code for name, code in index.items() if str(name).strip().casefold() == key[1]]
+            self._masks[key] = np.isin(codes, matching)
+        return self._masks[key]
+
+    def borrow_counts(self, member_codes, book_ids, n_members):
+        """Sparse members x catalog matrix of how often each member borrowed each book"""
+        positions = self.positions(book_ids)
+        known = positions >= 0
+        return sparse.csr_matrix(
+            (np.ones(known.sum()), (np.asarray(member_codes)[known], positions[known])),
+            shape=(n_members, self.size))
+
+    def score(self, counts):
+        """Dense members x catalog scores: genre matches x2 plus author matches"""
+        genres, authors = self._genre_author_matrices()
+        genre_prefs = (counts @ genres).toarray()
+        author_prefs = (counts @ authors).tocsr()
+        return GENRE_WEIGHT * genre_prefs[:, self.genre_codes] + AUTHOR_WEIGHT * (author_prefs @ authors.T).toarray()
+
+    def recommend(self, counts, top_n=5):
+        """Top-N (book_id, score) lists per member row, skipping books already borrowed"""
+        scores = self.score(counts)
+        counts = counts.tocsr()
+        results = []
+        for i in range(counts.shape[0]):
+            candidates = np.ones(self.size, dtype=bool)
+            candidates[counts.indices[counts.indptr[i]:counts.indptr[i + 1]]] = False
+            candidate_pos = np.flatnonzero(candidates)
+            best = candidate_pos[top_k(scores[i][candidate_pos], top_n)]
+            results.append([(self.ids[p], int(scores[i][p])) for p in best])
+        return results
@@ -0,0 +1,224 @@
+"""Semantic book search over a memory-mapped embedding cache"""
+
+import os
+import re
+import hashlib
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends from several processes are not serialised
+    fcntl = None
+from search_index import top_k, book_text
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words hashing encoder; needs no model files (offline/tests)"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = re.findall(r'\w+', text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.md5(feature.encode('utf-8')).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEncoder:
+    """Sentence Transformers model loaded from a local directory"""
+
+    def __init__(self, model_dir, batch_size=64):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_dir, device='cpu')
+        self.batch_size = batch_size
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{os.path.basename(os.path.normpath(model_dir))}-{self.dim}"
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def make_encoder(model_dir=None, dim=384):
+    """Sentence Transformers encoder for model_dir if it exists, else the hashing encoder"""
+    if model_dir and os.path.isdir(model_dir):
+        return SentenceTransformerEncoder(model_dir)
+    return HashingEncoder(dim)
+
+
+def content_key(title, author, genre):
+    """Cache key of a book's embedding; changes whenever its indexed text changes"""
+    return hashlib.sha1(book_text(title, author, genre).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Append-only float32 embedding matrix on disk, read through np.memmap.
+
+    Rows are keyed by content hash, so a book is encoded once per distinct
+    title/author/genre. The matrix lives in the page cache and is shared by
+    every process that maps it.
+    """
+
+    def __init__(self, root, encoder):
+        self.encoder = encoder
+        self.dir = os.path.join(root, encoder.name)
+        self.vectors_path = os.path.join(self.dir, 'vectors.f32')
+        self.keys_path = os.path.join(self.dir, 'keys.txt')
+        self.lock_path = os.path.join(self.dir, 'lock')
+        self.keys = []
+        self.key_index = {}
+        self._vectors = None
+        if os.path.isdir(self.dir):
+            with self._locked():
+                self._load_keys()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock on the cache directory, shared with every other process using it"""
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_keys(self):
+        """Read the keys and repair what an interrupted append left behind; call under _locked"""
+        if not os.path.exists(self.keys_path) or not os.path.exists(self.vectors_path):
+            self.keys, self.key_index = [], {}
+            return
+        with open(self.keys_path) as f:
+            lines = f.read().split('\n')
+        # The last element is '' after a complete write, else a partially written key
+        keys = [key for key in lines[:-1] if key]
+        row_bytes = 4 * self.encoder.dim
+        n_rows = os.path.getsize(self.vectors_path) // row_bytes
+        if len(keys) > n_rows:
+            keys = keys[:n_rows]
+        if lines[-1] or len(keys) < len(lines) - 1:
+            with open(self.keys_path, 'w') as f:
+                f.write(''.join(key + '\n' for key in keys))
+        # Rows past the last key were appended by a writer that died before
+        # recording their keys; left in place, new keys would map onto them
+        if os.path.getsize(self.vectors_path) != len(keys) * row_bytes:
+            os.truncate(self.vectors_path, len(keys) * row_bytes)
+        self.keys = keys
+        self.key_index = {key: row for row, key in enumerate(keys)}
+
+    @property
+    def vectors(self):
+        """Read-only memmap of all cached embeddings"""
+        if self._vectors is None or len(self._vectors) != len(self.keys):
+            if not self.keys:
+                return np.empty((0, self.encoder.dim), dtype=np.float32)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                      shape=(len(self.keys), self.encoder.dim))
+        return self._vectors
+
+    def ensure(self, keys, texts, batch_size=1024):
+        """Encode and append the texts whose keys are not cached yet
+        
+        Encoding runs unlocked; each batch is appended under the directory lock
+        after re-reading the keys, so rows always follow the keys on disk even
+        with other processes appending to the same cache.
+        """
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.key_index and key not in missing:
+                missing[key] = text
+        if not missing:
+            return 0
+        new_keys = list(missing)
+        appended = 0
+        for start in range(0, len(new_keys), batch_size):
+            batch = new_keys[start:start + batch_size]
+            vectors = self.encoder.encode([missing[k] for k in batch]).astype(np.float32)
+            with self._locked():
+                self._load_keys()
+                fresh = [i for i, key in enumerate(batch) if key not in self.key_index]
+                if not fresh:
+                    continue
+                with open(self.vectors_path, 'ab') as f:
+                    f.write(vectors[fresh].tobytes())
+                with open(self.keys_path, 'a') as f:
+                    f.write(''.join(batch[i] + '\n' for i in fresh))
+                for i in fresh:
+                    self.key_index[batch[i]] = len(self.keys)
+                    self.keys.append(batch[i])
+                appended += len(fresh)
+        return appended
+
+    def rows(self, keys):
+        return np.array([self.key_index[k] for k in keys], dtype=np.int64)
+
+
+class SemanticIndex:
+    """Maps catalog books to rows of an EmbeddingCache and ranks them against queries"""
+
+    def __init__(self, cache, block_size=65536):
+        self.cache = cache
+        self.block_size = block_size
+        self.book_ids = np.array([], dtype=np.int64)
+        self.rows = np.array([], dtype=np.int64)
+
+    @property
+    def size(self):
+        return len(self.book_ids)
+
+    def build(self, books_df):
+        """Point the index at the catalog, encoding only new or changed books"""
+        books = list(zip(books_df['title'], books_df['author'], books_df['genre']))
+        keys = [content_key(t, a, g) for t, a, g in books]
+        texts = [book_text(t, a, g) for t, a, g in books]
+        self.cache.ensure(keys, texts)
+        self.book_ids = books_df['id'].to_numpy(dtype=np.int64)
+        self.rows = self.cache.rows(keys)
+        return self
+
+    def matches(self, books_df):
+        """Check whether the index covers exactly the books in books_df"""
+        return len(books_df) == self.size and np.array_equal(books_df['id'].to_numpy(dtype=np.int64), self.book_ids)
+
+    def add_books(self, books):
+        """Append books (dicts with id, title, author, genre) to the index"""
+        if not books:
+            return
+        keys = [content_key(b['title'], b['author'], b['genre']) for b in books]
+        self.cache.ensure(keys, [book_text(b['title'], b['author'], b['genre']) for b in books])
+        self.book_ids = np.concatenate([self.book_ids, np.array([b['id'] for b in books], dtype=np.int64)])
+        self.rows = np.concatenate([self.rows, self.cache.rows(keys)])
+
+    def scores_many(self, queries):
+        """books x queries similarity matrix, in index order"""
+        query_vecs = self.cache.encoder.encode(list(queries))
+        vectors = self.cache.vectors
+        # Score the cache block by block straight from the memmap; slices are views, not copies
+        scores = np.empty((len(vectors), len(queries)), dtype=np.float32)
+        for start in range(0, len(vectors), self.block_size):
+            scores[start:start + self.block_size] = vectors[start:start + self.block_size] @ query_vecs.T
+        return scores[self.rows]
+
+    def search_many(self, queries, top_n=5):
+        """Return one list of (book_id, similarity) pairs per query"""
+        if self.size == 0:
+            return [[] for _ in queries]
+        scores = self.scores_many(queries)
+        return [[(self.book_ids[i], float(scores[i, q])) for i in top_k(scores[:, q], top_n)]
+                for q in range(len(queries))]
+
+    def search(self, query, top_n=5):
+        return self.search_many([query], top_n)[0]
@@ -66,19 +66,13 @@ class ReportExporter:
         if filename is None:
             filename = f"overdue_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
-        transactions_df = self.manager.get_all_transactions()
-        books_df = self.manager.get_all_books()
-        members_df = self.manager.get_all_members()
-        
-        # Filter overdue
-        overdue = transactions_df[
-            (transactions_df['status'] == 'borrowed') & 
-            (transactions_df['due_date'] < datetime.now())
-        ]
-        
+        overdue = self.manager.get_overdue_transactions()
         if overdue.empty:
             return None
         
+        books_df = self.manager.get_all_books()
+        members_df = self.manager.get_all_members()
+        
         report = overdue.merge(
             members_df[['id', 'name', 'email']], 
             left_on='member_id', 
@@ -0,0 +1,58 @@
+"""Per-member feature store: reference computation and rebuild/check command"""
+
+import sys
+import pandas as pd
+
+FEATURE_COLUMNS = ['borrows', 'fines', 'returned', 'late', 'late_rate']
+
+
+def compute_member_stats(transactions_df):
+    """Per-member features computed from scratch from the transaction history"""
+    if transactions_df.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS, index=pd.Index([], name='member_id'), dtype=float)
+    flags = pd.DataFrame({
+        'member_id': transactions_df['member_id'],
+        'fine': transactions_df['fine'],
+        'returned': transactions_df['status'] == 'returned',
+        'late': transactions_df['return_date'].notna() &
+                (transactions_df['return_date'] > transactions_df['due_date'])
+    })
+    stats = flags.groupby('member_id').agg(
+        borrows=('fine', 'size'), fines=('fine', 'sum'),
+        returned=('returned', 'sum'), late=('late', 'sum')
+    ).astype(float)
+    return with_late_rate(stats)
+
+
+def with_late_rate(stats):
+    """Add the late_rate column (late returns over completed returns)"""
+    stats['late_rate'] = (stats['late'] / stats['returned'].where(stats['returned'] > 0)).fillna(0.0)
+    return stats[FEATURE_COLUMNS]
+
+
+def check_member_stats(manager, tolerance=1e-6):
+    """Rows where the stored features differ from a from-scratch computation"""
+    expected = compute_member_stats(manager.get_all_transactions())
+    stored = manager.get_member_stats()
+    index = expected.index.union(stored.index)
+    expected = expected.reindex(index, fill_value=0.0)
+    stored = stored.reindex(index, fill_value=0.0)
+    diff = (expected - stored).abs() > tolerance
+    return pd.concat({'stored': stored, 'expected': expected}, axis=1)[diff.any(axis=1)]
+
+
+if __name__ == "__main__":
+    from library_manager import LibraryManager
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    manager = LibraryManager()
+    if command == 'rebuild':
+        count = manager.rebuild_member_stats()
+        print(f"✓ Rebuilt features for {count} members")
+    mismatches = check_member_stats(manager)
+    if mismatches.empty:
+        print("✓ Member feature store matches the transaction history")
+    else:
+        print(f"✗ {len(mismatches)} members differ from the transaction history:")
+        print(mismatches)
+        sys.exit(1)
@@ -0,0 +1,47 @@
+"""Column-projected SELECTs read straight into compact DataFrames"""
+
+import pandas as pd
+from sqlalchemy import select, type_coerce, String, DateTime
+
+ID_COLUMNS = ('id', 'member_id', 'book_id')
+CATEGORY_COLUMNS = ('author', 'genre', 'status')
+DATETIME_COLUMNS = ('join_date', 'borrow_date', 'due_date', 'return_date')
+
+
+def compact_frame(df):
+    """int32 ids, categorical genre/author/status and datetime64 date columns"""
+    for column in df.columns:
+        if column in ID_COLUMNS and df[column].notna().all():
+            df[column] = df[column].astype('int32')
+        elif column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype('category')
+        elif column in DATETIME_COLUMNS:
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+    return df
+
+
+def build_select(table, columns=None, where=None):
+    """SELECT columns (all by default, in the given order) FROM table WHERE ... ORDER BY id"""
+    cols = [table.c[name] for name in columns] if columns else list(table.c)
+    # Fetch dates as the driver returns them (ISO strings on SQLite) and parse them
+    # in one vectorised pd.to_datetime instead of one datetime object per value
+    cols = [type_coerce(c, String).label(c.name) if isinstance(c.type, DateTime) else c for c in cols]
+    stmt = select(*cols)
+    if where is not None:
+        for clause in where if isinstance(where, (list, tuple)) else [where]:
+            stmt = stmt.where(clause)
+    if 'id' in table.c:
+        stmt = stmt.order_by(table.c.id)
+    return stmt
+
+
+def read_frame(connection, table, columns=None, where=None, chunksize=None):
+    """Run the SELECT and return a compact DataFrame, or an iterator of them with chunksize.
+
+    Rows are never turned into ORM objects. Chunks are compacted independently, so
+    their categorical columns may have different categories.
+    """
+    stmt = build_select(table, columns, where)
+    if chunksize:
+        return (compact_frame(chunk) for chunk in pd.read_sql(stmt, connection, chunksize=chunksize))
+    return compact_frame(pd.read_sql(stmt, connection))
@@ -0,0 +1,209 @@
+"""Low-overhead call counts, latency percentiles and row counts for hot paths"""
+
+import re
+import json
+import time
+import math
+import inspect
+import threading
+import functools
+from bisect import bisect_left
+import config
+
+# Geometric latency buckets from 1us to ~17min, 10% apart: percentiles are exact to
+# within one bucket and every histogram is a fixed list of ints however many calls it sees
+BUCKET_GROWTH = 1.1
+BUCKET_BOUNDS = [1e-6 * BUCKET_GROWTH ** i for i in range(int(math.log(1e9) / math.log(BUCKET_GROWTH)) + 1)]
+
+
+class LatencyHistogram:
+    """Call count, total/max latency, bucketed latency distribution and row totals"""
+
+    __slots__ = ('count', 'total', 'max', 'buckets', 'rows', 'row_calls')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.rows = 0
+        self.row_calls = 0
+
+    def add(self, seconds, rows=None):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        if rows is not None:
+            self.rows += rows
+            self.row_calls += 1
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0 < q <= 100), in seconds"""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1e3,
+            'mean_ms': self.total / self.count * 1e3 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1e3,
+            'p95_ms': self.percentile(95) * 1e3,
+            'p99_ms': self.percentile(99) * 1e3,
+            'max_ms': self.max * 1e3,
+            'rows': self.rows if self.row_calls else None,
+            'rows_mean': self.rows / self.row_calls if self.row_calls else None
+        }
+
+
+class Metrics:
+    """Thread-safe registry of named LatencyHistograms"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started = time.time()
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, rows=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.add(seconds, rows)
+
+    def timer(self, name):
+        """Context manager recording the duration of its block under name"""
+        return _Timer(self, name)
+
+    def snapshot(self):
+        """{name: summary} for every recorded name"""
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self._histograms.items())}
+
+    def to_json(self, indent=2):
+        return json.dumps({'started': self.started, 'exported': time.time(), 'metrics': self.snapshot()},
+                          indent=indent)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.started = time.time()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+
+
+metrics = Metrics(enabled=config.INSTRUMENTATION_ENABLED)
+
+
+def row_count(result):
+    """Rows in a method result, or None when it is not a collection"""
+    if isinstance(result, dict) and 'hits' in result:
+        result = result['hits']
+    if isinstance(result, (str, bytes, tuple)) or not hasattr(result, '__len__'):
+        return None
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _timed(func, name, registry):
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def timed_generator(*args, **kwargs):
+            # Time the whole iteration, not just creating the generator
+            start = time.perf_counter()
+            rows = 0
+            try:
+                for item in func(*args, **kwargs):
+                    rows += row_count(item) or 0
+                    yield item
+            finally:
+                registry.record(name, time.perf_counter() - start, rows)
+        return timed_generator
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            registry.record(name, time.perf_counter() - start, row_count(result))
+    return timed
+
+
+def instrument_class(cls, prefix, registry=None):
+    """Time every public method of cls under '<prefix>.<method>'"""
+    registry = registry or metrics
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_'):
+            continue
+        if isinstance(value, staticmethod):
+            setattr(cls, attr, staticmethod(_timed(value.__func__, f"{prefix}.{attr}", registry)))
+        elif inspect.isfunction(value):
+            setattr(cls, attr, _timed(value, f"{prefix}.{attr}", registry))
+    return cls
+
+
+_SQL_SHAPE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|PRAGMA|CREATE|BEGIN|COMMIT|ROLLBACK|\w+)"
+                        r"(?:.*?\b(?:FROM|INTO|UPDATE)\s+\"?(\w+))?", re.IGNORECASE | re.DOTALL)
+
+
+def statement_name(statement):
+    """Short label for a SQL statement, e.g. 'sql.SELECT transactions'"""
+    match = _SQL_SHAPE.match(statement)
+    if not match:
+        return 'sql.OTHER'
+    verb, table = match.group(1).upper(), match.group(2)
+    return f"sql.{verb} {table}" if table else f"sql.{verb}"
+
+
+def instrument_sql(engine, registry=None):
+    """Time every statement an SQLAlchemy engine executes, grouped by verb and table"""
+    from sqlalchemy import event
+    registry = registry or metrics
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        registry.record(statement_name(statement), elapsed, rows)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    return engine
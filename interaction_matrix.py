@@ -0,0 +1,106 @@
+"""Sparse member x book borrow-count matrix shared by the recommenders"""
+
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class InteractionMatrix:
+    """CSR matrix of borrow counts with stable member/book id <-> row/column maps.
+
+    Borrows recorded after the build are buffered and folded into the CSR
+    matrix the next time it is read, so a burst of borrows costs one rewrite.
+    Recording and folding share a lock, as borrows arrive on the writer's thread
+    while other sessions read; a folded matrix is never modified afterwards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.member_ids = []
+        self.book_ids = []
+        self.member_index = {}
+        self.book_index = {}
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self._pending = []
+        self.n_transactions = 0
+        self.last_transaction_id = None
+
+    def build(self, transactions_df):
+        """Build the matrix from the full transaction history"""
+        self._reset()
+        if transactions_df.empty:
+            return self
+        rows, self.member_ids = pd.factorize(transactions_df['member_id'])
+        cols, self.book_ids = pd.factorize(transactions_df['book_id'])
+        self.member_ids = self.member_ids.tolist()
+        self.book_ids = self.book_ids.tolist()
+        self.member_index = {m: i for i, m in enumerate(self.member_ids)}
+        self.book_index = {b: i for i, b in enumerate(self.book_ids)}
+        self._matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(len(self.member_ids), len(self.book_ids))
+        )
+        self._matrix.sum_duplicates()
+        self.n_transactions = len(transactions_df)
+        self.last_transaction_id = transactions_df['id'].iloc[-1] if 'id' in transactions_df else None
+        return self
+
+    def matches(self, transactions_df):
+        """Check whether the matrix reflects exactly the given transactions"""
+        if len(transactions_df) != self.n_transactions:
+            return False
+        if transactions_df.empty or 'id' not in transactions_df:
+            return True
+        return transactions_df['id'].iloc[-1] == self.last_transaction_id
+
+    def _member_row(self, member_id):
+        row = self.member_index.get(member_id)
+        if row is None:
+            row = self.member_index[member_id] = len(self.member_ids)
+            self.member_ids.append(member_id)
+        return row
+
+    def _book_col(self, book_id):
+        col = self.book_index.get(book_id)
+        if col is None:
+            col = self.book_index[book_id] = len(self.book_ids)
+            self.book_ids.append(book_id)
+        return col
+
+    def add_borrow(self, member_id, book_id, transaction_id=None):
+        """Record one borrow without rebuilding the matrix"""
+        with self._lock:
+            self._pending.append((self._member_row(member_id), self._book_col(book_id)))
+            self.n_transactions += 1
+            self.last_transaction_id = transaction_id
+
+    @property
+    def matrix(self):
+        """The CSR matrix, with any buffered borrows folded in"""
+        with self._lock:
+            shape = (len(self.member_ids), len(self.book_ids))
+            if self._pending or self._matrix.shape != shape:
+                rows, cols = zip(*self._pending) if self._pending else ((), ())
+                delta = sparse.csr_matrix(
+                    (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=shape
+                )
+                # Pad the old matrix to the new shape without resizing it in place,
+                # since readers may still hold it
+                old = self._matrix
+                indptr = np.concatenate([old.indptr, np.full(shape[0] - old.shape[0], old.indptr[-1],
+                                                              dtype=old.indptr.dtype)])
+                padded = sparse.csr_matrix((old.data, old.indices, indptr), shape=shape)
+                self._matrix = (padded + delta).tocsr()
+                self._pending = []
+            return self._matrix
+
+    def member_row(self, member_id):
+        """Sparse 1 x n_books row for a member, or None if they never borrowed"""
+        row = self.member_index.get(member_id)
+        if row is None:
+            return None
+        return self.matrix[row]
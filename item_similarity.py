@@ -0,0 +1,73 @@
+"""Precomputed item-item ("readers also borrowed") neighbour lists"""
+
+import numpy as np
+from search_index import top_k
+
+
+class ItemNeighbors:
+    """Top-K most co-borrowed books for every book, stored as dense arrays.
+
+    ``neighbors[c]`` holds the interaction-matrix columns of the books most
+    similar to column ``c`` (padded with -1) and ``scores[c]`` their cosine
+    similarity over the sets of members who borrowed them.
+    """
+
+    def __init__(self, k=20):
+        self.k = k
+        self.book_ids = []
+        self.book_index = {}
+        self.neighbors = np.empty((0, k), dtype=np.int32)
+        self.scores = np.empty((0, k), dtype=np.float32)
+        self.n_transactions = 0
+
+    def build(self, interactions):
+        """Compute the neighbour table from an InteractionMatrix"""
+        borrowed = (interactions.matrix > 0).astype(np.float32)
+        n_books = borrowed.shape[1]
+        co_borrows = (borrowed.T @ borrowed).tocsr()
+        co_borrows.setdiag(0)
+        co_borrows.eliminate_zeros()
+
+        readers = np.sqrt(np.asarray(borrowed.sum(axis=0)).ravel())
+        self.neighbors = np.full((n_books, self.k), -1, dtype=np.int32)
+        self.scores = np.zeros((n_books, self.k), dtype=np.float32)
+        for col in range(n_books):
+            start, end = co_borrows.indptr[col], co_borrows.indptr[col + 1]
+            if start == end:
+                continue
+            others = co_borrows.indices[start:end]
+            similarity = co_borrows.data[start:end] / (readers[col] * readers[others])
+            best = top_k(similarity, self.k)
+            self.neighbors[col, :len(best)] = others[best]
+            self.scores[col, :len(best)] = similarity[best]
+
+        self.book_ids = list(interactions.book_ids)
+        self.book_index = dict(interactions.book_index)
+        self.n_transactions = interactions.n_transactions
+        return self
+
+    def similar_books(self, book_id, top_n=5):
+        """Books most often borrowed by the readers of book_id"""
+        col = self.book_index.get(book_id)
+        if col is None or col >= len(self.neighbors):
+            return []
+        neighbors = self.neighbors[col, :top_n]
+        valid = neighbors >= 0
+        return [(self.book_ids[c], float(s)) for c, s in zip(neighbors[valid], self.scores[col, :top_n][valid])]
+
+    def recommend(self, borrowed_book_ids, top_n=5):
+        """Merge the neighbour lists of the books a member borrowed"""
+        cols = np.array([self.book_index[b] for b in borrowed_book_ids
+                         if self.book_index.get(b, len(self.neighbors)) < len(self.neighbors)], dtype=np.int64)
+        if len(cols) == 0:
+            return []
+        neighbors = self.neighbors[cols].ravel()
+        valid = neighbors >= 0
+        scores = np.bincount(neighbors[valid], weights=self.scores[cols].ravel()[valid],
+                             minlength=len(self.neighbors))
+        candidates = np.zeros(len(scores), dtype=bool)
+        candidates[neighbors[valid]] = True
+        candidates[cols] = False
+        candidate_cols = np.flatnonzero(candidates)
+        best = candidate_cols[top_k(scores[candidate_cols], top_n)]
+        return [(self.book_ids[c], float(scores[c])) for c in best]
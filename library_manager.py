@@ -1,19 +1,73 @@
-from models import Session, Member, Book, Transaction
+from models import (scoped_sessions, Member, Book, Transaction, MemberStats, LibraryCounters, COUNTERS_ID,
+                    bump_counters, init_db)
 from datetime import datetime, timedelta
-import pandas as pd
-from sqlalchemy import func
+from collections import Counter
+import time
+import random
+from sqlalchemy import func, case, select, update, bindparam
+from sqlalchemy.exc import DBAPIError
+from feature_store import with_late_rate
+from instrumentation import instrument_class
+from frame_loader import read_frame
+
+MEMBER_COLUMNS = ['id', 'name', 'email', 'join_date', 'total_fines', 'is_active']
+BOOK_COLUMNS = ['id', 'title', 'author', 'genre', 'isbn', 'total_copies', 'available_copies', 'available']
+TRANSACTION_COLUMNS = ['id', 'member_id', 'book_id', 'borrow_date', 'due_date', 'return_date', 'fine', 'status']
+
+class _Conflict(Exception):
+    """Rows changed between a read and the guarded update that relied on it; retried"""
+
+
+def _is_conflict(error):
+    """Whether a database error is a lock/serialization conflict worth retrying"""
+    code = getattr(error.orig, 'pgcode', None) or getattr(error.orig, 'sqlstate', None)
+    message = str(error.orig).lower()
+    return code in ('40001', '40P01') or 'database is locked' in message or 'deadlock' in message
+
 
 class LibraryManager:
     def __init__(self):
-        self.session = Session()
+        init_db()
+        # One manager can serve many threads: each gets its own session
+        self._sessions = scoped_sessions()
         self.fine_per_day = 2.0
         self.max_borrow_days = 14
         self.max_books_per_member = 3
+        self.max_retries = 5
+        self.retry_backoff = 0.05
+        self.listeners = []
+        if (self.session.query(MemberStats).first() is None and
+                self.session.query(Transaction).first() is not None):
+            self.rebuild_member_stats()
+        self.release_session()
+    
+    @property
+    def session(self):
+        """The calling thread's session"""
+        return self._sessions()
+    
+    def release_session(self):
+        """Close the calling thread's session, returning its connection to the pool.
+        
+        Call at the end of each request; the next use in the thread starts a fresh one.
+        """
+        self._sessions.remove()
+    
+    def add_listener(self, listener):
+        """Register an object whose on_<event> methods are called after writes"""
+        self.listeners.append(listener)
+    
+    def _notify(self, event, *args):
+        for listener in self.listeners:
+            handler = getattr(listener, f'on_{event}', None)
+            if handler is not None:
+                handler(*args)
     
     def add_member(self, name, email):
         """Register a new member"""
         member = Member(name=name, email=email)
         self.session.add(member)
+        bump_counters(self.session, active_members=1)
         self.session.commit()
         return member.id
     
@@ -22,119 +76,325 @@ class LibraryManager:
         book = Book(title=title, author=author, genre=genre, isbn=isbn, 
                    total_copies=copies, available_copies=copies)
         self.session.add(book)
+        bump_counters(self.session, total_books=1)
         self.session.commit()
+        self._notify('book_added', {
+            'id': book.id, 'title': title, 'author': author, 'genre': genre
+        })
         return book.id
     
+    def import_file(self, kind, path, **options):
+        """Bulk import 'books' or 'members' from a CSV/JSONL file; see bulk_import.import_file"""
+        from bulk_import import import_file
+        return import_file(kind, path, self, notify=self._notify, **options)
+    
+    def import_records(self, kind, records, **options):
+        """Bulk import an iterable of (line number, dict) records; see bulk_import.import_records"""
+        from bulk_import import import_records
+        return import_records(kind, records, self, notify=self._notify, **options)
+    
     def borrow_book(self, member_id, book_id):
-        """Process book borrowing"""
-        member = self.session.query(Member).filter_by(id=member_id).first()
-        book = self.session.query(Book).filter_by(id=book_id).first()
+        """Process book borrowing (a one-item borrow_books)"""
+        return self.borrow_books([(member_id, book_id)])[0]
+    
+    def return_book(self, transaction_id):
+        """Process book return and calculate fine (a one-item return_books)"""
+        return self.return_books([transaction_id])[0]
+    
+    def borrow_books(self, items):
+        """Check out a cart of (member_id, book_id) pairs in one transaction
         
-        if not member or not book:
-            return False, "Member or Book not found"
+        Members, their open-loan counts and books are read with one query each, and
+        the borrow limit and stock are applied across the cart in order. Members are
+        locked and copies taken with a guarded update, so concurrent checkouts can
+        neither oversell a copy nor take a member past the limit.
+        A cart is all or nothing: if any item is refused, no book is borrowed.
+        Returns a (success, message) pair per item.
+        """
+        items = list(items)
+        if not items:
+            return []
         
-        if not member.is_active:
-            return False, "Member account is inactive"
+        def checkout():
+            member_ids = {member_id for member_id, _ in items}
+            book_ids = {book_id for _, book_id in items}
+            # Lock the members first; concurrent checkouts for them queue here
+            self._update(update(Member).where(Member.id.in_(member_ids), Member.is_active == True)
+                         .values(is_active=Member.is_active))
+            active = dict(self.session.execute(
+                select(Member.id, Member.is_active).where(Member.id.in_(member_ids))).all())
+            open_loans = dict(self.session.execute(
+                select(Transaction.member_id, func.count())
+                .where(Transaction.member_id.in_(member_ids), Transaction.status == 'borrowed')
+                .group_by(Transaction.member_id)).all())
+            stock = dict(self.session.execute(
+                select(Book.id, Book.available_copies).where(Book.id.in_(book_ids)).with_for_update()).all())
+            
+            results, loans, taken = [], [], Counter()
+            due_date = datetime.now() + timedelta(days=self.max_borrow_days)
+            for member_id, book_id in items:
+                if member_id not in active or book_id not in stock:
+                    results.append((False, "Member or Book not found"))
+                elif not active[member_id]:
+                    results.append((False, "Member account is inactive"))
+                elif open_loans.get(member_id, 0) >= self.max_books_per_member:
+                    results.append((False, f"Maximum {self.max_books_per_member} books allowed"))
+                elif stock[book_id] <= 0:
+                    results.append((False, "Book not available"))
+                else:
+                    open_loans[member_id] = open_loans.get(member_id, 0) + 1
+                    stock[book_id] -= 1
+                    taken[book_id] += 1
+                    loans.append(Transaction(member_id=member_id, book_id=book_id, due_date=due_date,
+                                             status='borrowed'))
+                    results.append((True, "Book borrowed successfully"))
+            if len(loans) < len(items):
+                return [result if not result[0] else (False, "Not borrowed: another item in the cart was refused")
+                        for result in results], []
+            
+            books = Book.__table__
+            # SET expressions see the old row: available becomes (copies left > 0)
+            taken_rows = self._update_many(
+                update(books).where(books.c.id == bindparam('b_id'), books.c.available_copies >= bindparam('n'))
+                .values(available_copies=books.c.available_copies - bindparam('n'),
+                        available=books.c.available_copies > bindparam('n')),
+                [{'b_id': book_id, 'n': n} for book_id, n in taken.items()])
+            if taken_rows != len(taken):
+                raise _Conflict("stock changed since it was read")
+            self.session.add_all(loans)
+            for member_id, n in Counter(loan.member_id for loan in loans).items():
+                self._bump_member_stats(member_id, borrow_count=n)
+            bump_counters(self.session, open_loans=len(loans))
+            self.session.flush()
+            return results, [{'id': loan.id, 'member_id': loan.member_id, 'book_id': loan.book_id,
+                              'borrow_date': loan.borrow_date, 'due_date': loan.due_date} for loan in loans]
         
-        active_borrows = self.session.query(Transaction).filter_by(
-            member_id=member_id, status='borrowed'
-        ).count()
+        results, loans = self._atomic(checkout)
+        for loan in loans:
+            self._notify('book_borrowed', loan)
+        return results
+    
+    def return_books(self, transaction_ids):
+        """Return a list of loans in one transaction; a (success, message) pair per id
         
-        if active_borrows >= self.max_books_per_member:
-            return False, f"Maximum {self.max_books_per_member} books allowed"
+        Loans are closed with a guarded update, so each can only be returned (and its
+        copy put back) once however many requests race for it.
+        """
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return []
         
-        if book.available_copies <= 0:
-            return False, "Book not available"
+        def check_in():
+            loans = {loan.id: loan for loan in self.session.execute(
+                select(Transaction.id, Transaction.member_id, Transaction.book_id, Transaction.due_date)
+                .where(Transaction.id.in_(set(transaction_ids)), Transaction.status == 'borrowed')
+                .with_for_update())}
+            return_date = datetime.now()
+            results, closed = [], []
+            for transaction_id in transaction_ids:
+                # pop: an id listed twice is only returned once
+                loan = loans.pop(transaction_id, None)
+                if loan is None:
+                    results.append((False, "Invalid transaction"))
+                    continue
+                late = return_date > loan.due_date
+                fine = (return_date - loan.due_date).days * self.fine_per_day if late else 0.0
+                closed.append({'id': transaction_id, 'member_id': loan.member_id, 'book_id': loan.book_id,
+                               'return_date': return_date, 'due_date': loan.due_date, 'fine': fine,
+                               'late': late})
+                results.append((True, f"Book returned. Fine: ${fine:.2f}"))
+            if not closed:
+                return results, []
+            
+            transactions, books, members = Transaction.__table__, Book.__table__, Member.__table__
+            closed_rows = self._update_many(
+                update(transactions)
+                .where(transactions.c.id == bindparam('t_id'), transactions.c.status == 'borrowed')
+                .values(status='returned', return_date=return_date, fine=bindparam('t_fine')),
+                [{'t_id': loan['id'], 't_fine': loan['fine']} for loan in closed])
+            if closed_rows != len(closed):
+                raise _Conflict("loan returned concurrently")
+            
+            returned = Counter(loan['book_id'] for loan in closed)
+            self._update_many(
+                update(books).where(books.c.id == bindparam('b_id'))
+                .values(available_copies=books.c.available_copies + bindparam('n'), available=True),
+                [{'b_id': book_id, 'n': n} for book_id, n in returned.items()])
+            fines, late, back = Counter(), Counter(), Counter()
+            for loan in closed:
+                back[loan['member_id']] += 1
+                if loan['late']:
+                    late[loan['member_id']] += 1
+                    fines[loan['member_id']] += loan['fine']
+            if fines:
+                self._update_many(
+                    update(members).where(members.c.id == bindparam('m_id'))
+                    .values(total_fines=members.c.total_fines + bindparam('m_fine')),
+                    [{'m_id': member_id, 'm_fine': fine} for member_id, fine in fines.items()])
+            for member_id, n in back.items():
+                self._bump_member_stats(member_id, returned_count=n, late_count=late[member_id],
+                                        total_fines=fines[member_id])
+            bump_counters(self.session, open_loans=-len(closed), total_fines=sum(fines.values()))
+            return results, closed
         
-        due_date = datetime.now() + timedelta(days=self.max_borrow_days)
-        transaction = Transaction(
-            member_id=member_id,
-            book_id=book_id,
-            due_date=due_date,
-            status='borrowed'
-        )
+        results, closed = self._atomic(check_in)
+        for loan in closed:
+            loan.pop('late')
+            self._notify('book_returned', loan)
+        return results
+    
+    def _update(self, statement):
+        """Execute a bulk UPDATE and return how many rows matched"""
+        return self.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+    
+    def _update_many(self, statement, params):
+        """Execute an UPDATE once per parameter set; returns how many rows matched in total"""
+        if self.session.get_bind().dialect.supports_sane_multi_rowcount:
+            return self.session.execute(statement, params).rowcount
+        # Drivers that batch executemany (e.g. psycopg2) can't report matched rows
+        return sum(self.session.execute(statement, p).rowcount for p in params)
+    
+    def _atomic(self, work):
+        """Run work() and commit, retrying on lock conflicts; returns work's result
         
-        book.available_copies -= 1
-        book.available = book.available_copies > 0
+        work raises _Conflict when a guarded update finds rows changed since it read them.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = work()
+                self.session.commit()
+                return result
+            except (DBAPIError, _Conflict) as e:
+                self.session.rollback()
+                if attempt == self.max_retries or not (isinstance(e, _Conflict) or _is_conflict(e)):
+                    raise
+                time.sleep(self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+    
+    def _bump_member_stats(self, member_id, **deltas):
+        """Add deltas to a member's feature-store row, creating it on first use"""
+        updated = self._update(update(MemberStats).where(MemberStats.member_id == member_id).values(
+            **{column: getattr(MemberStats, column) + delta for column, delta in deltas.items()}))
+        if not updated:
+            row = dict(borrow_count=0, returned_count=0, late_count=0, total_fines=0.0)
+            row.update(deltas)
+            self.session.add(MemberStats(member_id=member_id, **row))
+    
+    def get_member_stats(self):
+        """Per-member features from the feature store, indexed by member_id"""
+        stats = self._read(MemberStats, ['member_id', 'borrow_count', 'total_fines', 'returned_count', 'late_count'])
+        stats = stats.set_index('member_id').rename(columns={
+            'borrow_count': 'borrows', 'total_fines': 'fines', 'returned_count': 'returned', 'late_count': 'late'
+        }).astype(float)
+        return with_late_rate(stats)
+    
+    def rebuild_member_stats(self):
+        """Recompute the feature store from the full transaction history"""
+        late = (Transaction.return_date.isnot(None)) & (Transaction.return_date > Transaction.due_date)
+        rows = self.session.query(
+            Transaction.member_id,
+            func.count(Transaction.id),
+            func.sum(case((Transaction.status == 'returned', 1), else_=0)),
+            func.sum(case((late, 1), else_=0)),
+            func.coalesce(func.sum(Transaction.fine), 0.0)
+        ).group_by(Transaction.member_id).all()
         
-        self.session.add(transaction)
+        self.session.query(MemberStats).delete()
+        self.session.add_all([
+            MemberStats(member_id=member_id, borrow_count=borrows, returned_count=returned,
+                        late_count=late_count, total_fines=fines)
+            for member_id, borrows, returned, late_count, fines in rows
+        ])
         self.session.commit()
-        return True, "Book borrowed successfully"
+        return len(rows)
     
-    def return_book(self, transaction_id):
-        """Process book return and calculate fine"""
-        transaction = self.session.query(Transaction).filter_by(id=transaction_id).first()
-        
-        if not transaction or transaction.status == 'returned':
-            return False, "Invalid transaction"
-        
-        transaction.return_date = datetime.now()
-        transaction.status = 'returned'
-        
-        if transaction.return_date > transaction.due_date:
-            days_late = (transaction.return_date - transaction.due_date).days
-            transaction.fine = days_late * self.fine_per_day
-            
-            member = self.session.query(Member).filter_by(id=transaction.member_id).first()
-            member.total_fines += transaction.fine
-        
-        book = self.session.query(Book).filter_by(id=transaction.book_id).first()
-        book.available_copies += 1
-        book.available = True
+    def _read(self, model, columns, where=None, chunksize=None):
+        return read_frame(self.session.connection(), model.__table__, columns, where, chunksize)
+    
+    def get_all_members(self, columns=None, where=None, chunksize=None):
+        """Get all members as DataFrame
         
-        self.session.commit()
-        return True, f"Book returned. Fine: ${transaction.fine:.2f}"
-    
-    def get_all_members(self):
-        """Get all members as DataFrame"""
-        members = self.session.query(Member).all()
-        return pd.DataFrame([{
-            'id': m.id,
-            'name': m.name,
-            'email': m.email,
-            'join_date': m.join_date,
-            'total_fines': m.total_fines,
-            'is_active': m.is_active
-        } for m in members])
-    
-    def get_all_books(self):
+        columns selects a subset of columns, where takes SQLAlchemy clauses
+        (e.g. Member.is_active == True) and chunksize yields DataFrames of that
+        many rows. The same options apply to get_all_books and get_all_transactions.
+        """
+        return self._read(Member, columns or MEMBER_COLUMNS, where, chunksize)
+    
+    def get_all_books(self, columns=None, where=None, chunksize=None):
         """Get all books as DataFrame"""
-        books = self.session.query(Book).all()
-        return pd.DataFrame([{
-            'id': b.id,
-            'title': b.title,
-            'author': b.author,
-            'genre': b.genre,
-            'isbn': b.isbn,
-            'total_copies': b.total_copies,
-            'available_copies': b.available_copies,
-            'available': b.available
-        } for b in books])
-    
-    def get_all_transactions(self):
+        return self._read(Book, columns or BOOK_COLUMNS, where, chunksize)
+    
+    def get_all_transactions(self, columns=None, where=None, chunksize=None):
         """Get all transactions as DataFrame"""
-        transactions = self.session.query(Transaction).all()
-        return pd.DataFrame([{
-            'id': t.id,
-            'member_id': t.member_id,
-            'book_id': t.book_id,
-            'borrow_date': t.borrow_date,
-            'due_date': t.due_date,
-            'return_date': t.return_date,
-            'fine': t.fine,
-            'status': t.status
-        } for t in transactions])
+        return self._read(Transaction, columns or TRANSACTION_COLUMNS, where, chunksize)
+    
+    def get_overdue_transactions(self, as_of=None, columns=None):
+        """Open loans past their due date, filtered in SQL on the (status, due_date) index"""
+        as_of = as_of or datetime.now()
+        return self.get_all_transactions(columns, where=[Transaction.status == 'borrowed',
+                                                         Transaction.due_date < as_of])
     
     def get_dashboard_stats(self):
-        """Get statistics for dashboard"""
-        total_books = self.session.query(Book).count()
-        total_members = self.session.query(Member).filter_by(is_active=True).count()
-        borrowed_books = self.session.query(Transaction).filter_by(status='borrowed').count()
-        total_fines = self.session.query(func.sum(Member.total_fines)).scalar() or 0
+        """Get statistics for dashboard
+        
+        One primary-key read of the counters the write methods maintain.
+        """
+        counters = self._stored_counters()
+        if counters is None:
+            self.reconcile_counters()
+            counters = self._stored_counters()
         
         return {
-            'total_books': total_books,
-            'total_members': total_members,
-            'borrowed_books': borrowed_books,
-            'total_fines': total_fines
+            'total_books': counters['total_books'],
+            'total_members': counters['active_members'],
+            'borrowed_books': counters['open_loans'],
+            'total_fines': counters['total_fines']
         }
+    
+    def _stored_counters(self):
+        row = self.session.execute(
+            select(LibraryCounters.total_books, LibraryCounters.active_members, LibraryCounters.open_loans,
+                   LibraryCounters.total_fines).where(LibraryCounters.id == COUNTERS_ID)).first()
+        return row._asdict() if row is not None else None
+    
+    def _count_counters(self):
+        """The dashboard counters computed from the tables, in one query"""
+        row = self.session.execute(select(
+            select(func.count()).select_from(Book).scalar_subquery().label('total_books'),
+            select(func.count()).select_from(Member).where(Member.is_active == True)
+            .scalar_subquery().label('active_members'),
+            select(func.count()).select_from(Transaction).where(Transaction.status == 'borrowed')
+            .scalar_subquery().label('open_loans'),
+            select(func.coalesce(func.sum(Member.total_fines), 0.0)).scalar_subquery().label('total_fines'),
+        )).one()
+        return row._asdict()
+    
+    @staticmethod
+    def _counter_drift(stored, actual, tolerance=1e-6):
+        """{counter: (stored, actual)} for the counters that differ"""
+        stored = stored or {}
+        return {name: (stored.get(name), value) for name, value in actual.items()
+                if stored.get(name) is None or abs(stored[name] - value) > tolerance}
+    
+    def check_counters(self):
+        """{counter: (stored, actual)} for dashboard counters that differ from the tables"""
+        return self._counter_drift(self._stored_counters(), self._count_counters())
+    
+    def reconcile_counters(self):
+        """Reset the dashboard counters to values recomputed from the tables; returns the drift fixed
+        
+        The counters row is locked first, so writes that land meanwhile are either
+        counted here or applied on top afterwards.
+        """
+        def reconcile():
+            locked = self._update(update(LibraryCounters).where(LibraryCounters.id == COUNTERS_ID)
+                                  .values(id=LibraryCounters.id))
+            stored, actual = self._stored_counters(), self._count_counters()
+            if locked:
+                self._update(update(LibraryCounters).where(LibraryCounters.id == COUNTERS_ID)
+                             .values(reconciled_at=datetime.now(), **actual))
+            else:
+                self.session.add(LibraryCounters(id=COUNTERS_ID, reconciled_at=datetime.now(), **actual))
+            return self._counter_drift(stored, actual)
+        return self._atomic(reconcile)
+
+instrument_class(LibraryManager, 'manager')
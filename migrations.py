@@ -0,0 +1,89 @@
+"""Versioned, in-place schema migrations for existing library databases
+
+Usage:
+    python migrations.py           # apply pending migrations to library.db
+    python migrations.py status    # show the current and latest schema versions
+
+models.init_db() runs create_all and then migrate(), so migrations must be
+idempotent: a fresh database already has everything create_all builds.
+"""
+
+import sys
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+# (version, description, statements); append only, never edit an applied entry
+MIGRATIONS = [
+    (1, "Indexes for open-loan, dashboard and overdue queries", [
+        "CREATE INDEX IF NOT EXISTS ix_transactions_member_status ON transactions (member_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_transactions_status_due_date ON transactions (status, due_date)",
+        "ANALYZE transactions",
+    ]),
+    (2, "Backfill the dashboard counters row from the current tables", [
+        "INSERT INTO library_counters (id, total_books, active_members, open_loans, total_fines) "
+        "SELECT 1, (SELECT COUNT(*) FROM books), (SELECT COUNT(*) FROM members WHERE is_active), "
+        "(SELECT COUNT(*) FROM transactions WHERE status = 'borrowed'), "
+        "(SELECT COALESCE(SUM(total_fines), 0) FROM members) "
+        "WHERE NOT EXISTS (SELECT 1 FROM library_counters)",
+    ]),
+]
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} "
+                      "(version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)"))
+    return conn.execute(text(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+
+
+def migrate(engine, target=None):
+    """Apply every migration newer than the database's version, one transaction each.
+
+    Safe to run from several processes at once: each migration is applied by
+    exactly one of them. Returns the list of versions applied.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for number, description, statements in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        with engine.connect() as conn:
+            # Claim the version row before anything else: the insert takes the write
+            # lock, so a concurrent migrate waits here and then finds the row taken
+            # instead of applying the migration a second time
+            try:
+                conn.execute(text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) "
+                                  "VALUES (:version, :description, :applied_at)"),
+                             {'version': number, 'description': description,
+                              'applied_at': datetime.now().isoformat(timespec='seconds')})
+            except IntegrityError:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.commit()
+        applied.append(number)
+    return applied
+
+
+def status(engine):
+    with engine.begin() as conn:
+        return current_version(conn), LATEST_VERSION
+
+
+if __name__ == '__main__':
+    from models import engine, init_db
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        version, latest = status(engine)
+        print(f"Schema version {version} (latest {latest})")
+    else:
+        before, latest = status(engine)
+        init_db()
+        version, _ = status(engine)
+        print(f"Migrated schema from version {before} to {version} (latest {latest})")
@@ -0,0 +1,90 @@
+"""Versioned on-disk store for trained models and indexes"""
+
+import os
+import json
+import pickle
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+
+def data_fingerprint(df):
+    """Content hash of a DataFrame, used as the data version of artifacts built from it"""
+    if df is None or df.empty:
+        return 'empty'
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:16]
+
+
+class ModelStore:
+    """Pickled artifacts on local disk, one file per (name, fingerprint).
+
+    ``manifest.json`` records the versions of every artifact, newest last; only
+    the most recent ``keep`` versions of each name are kept on disk.
+    """
+
+    def __init__(self, root, keep=3):
+        self.root = root
+        self.keep = keep
+        self.manifest_path = os.path.join(root, 'manifest.json')
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def fingerprint(self, name):
+        """Fingerprint of the latest saved version of name, or None"""
+        versions = self._read_manifest().get(name)
+        return versions[-1]['fingerprint'] if versions else None
+
+    def save(self, name, obj, fingerprint, **metadata):
+        """Save obj as the latest version of name"""
+        os.makedirs(self.root, exist_ok=True)
+        filename = f"{name}-{fingerprint}.pkl"
+        path = os.path.join(self.root, filename)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+        manifest = self._read_manifest()
+        versions = [v for v in manifest.get(name, []) if v['file'] != filename]
+        versions.append({
+            'file': filename,
+            'fingerprint': fingerprint,
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            **metadata
+        })
+        for old in versions[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.root, old['file']))
+            except OSError:
+                pass
+        manifest[name] = versions[-self.keep:]
+        self._write_manifest(manifest)
+
+    def metadata(self, name):
+        """Manifest entry of the latest version of name, or None"""
+        versions = self._read_manifest().get(name)
+        return versions[-1] if versions else None
+
+    def load(self, name, fingerprint=None):
+        """Load the latest version of name (or the one matching fingerprint), or None"""
+        versions = self._read_manifest().get(name, [])
+        if fingerprint is not None:
+            versions = [v for v in versions if v['fingerprint'] == fingerprint]
+        if not versions:
+            return None
+        try:
+            with open(os.path.join(self.root, versions[-1]['file']), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
@@ -0,0 +1,97 @@
+"""Background retraining of the AIEngine models"""
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTrainer:
+    """Daemon thread that retrains an AIEngine on a schedule or after enough new loans.
+
+    ``manager_factory`` returns the LibraryManager the thread reads from; the
+    worker uses its own thread-scoped session and releases it after each run.
+    Register the trainer as a LibraryManager listener to count events.
+    """
+
+    def __init__(self, engine, manager_factory, interval=3600, retrain_after=50):
+        self.engine = engine
+        self.manager_factory = manager_factory
+        self.interval = interval
+        self.retrain_after = retrain_after
+        self.pending_events = 0
+        self.last_trained = None
+        self.last_error = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, train_now=True):
+        """Start the worker thread; it trains once right away unless train_now is False"""
+        if self.running:
+            return self
+        self._stopped.clear()
+        if train_now:
+            self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name='model-trainer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request(self):
+        """Ask for a retrain as soon as the worker is free"""
+        self._wakeup.set()
+
+    def _record_event(self):
+        with self._lock:
+            self.pending_events += 1
+            due = self.pending_events >= self.retrain_after
+        if due:
+            self.request()
+
+    def on_book_borrowed(self, transaction):
+        self._record_event()
+
+    def on_book_returned(self, transaction):
+        self._record_event()
+
+    def run_once(self):
+        """Load fresh data and retrain; returns True if new models were published"""
+        with self._lock:
+            self.pending_events = 0
+        manager = self.manager_factory()
+        try:
+            members_df = manager.get_all_members()
+            transactions_df = manager.get_all_transactions()
+            member_stats = manager.get_member_stats()
+        finally:
+            manager.release_session()
+        published = self.engine.retrain(members_df, transactions_df, member_stats)
+        # Books appended to the search index since the last run are saved here, off the request path
+        self.engine.save_search_index()
+        self.last_trained = time.time()
+        return published
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Background model training failed")
@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import create_engine, event, update, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from datetime import datetime
+from instrumentation import instrument_sql
+import config
 
 Base = declarative_base()
 
@@ -39,7 +42,85 @@ class Transaction(Base):
     status = Column(String, default='borrowed')
     member = relationship('Member', back_populates='transactions')
     book = relationship('Book', back_populates='transactions')
+    
+    # Open loans per member, and status counts / overdue scans (status is the leading column);
+    # existing databases get these through migrations.py
+    __table_args__ = (
+        Index('ix_transactions_member_status', 'member_id', 'status'),
+        Index('ix_transactions_status_due_date', 'status', 'due_date'),
+    )
 
-engine = create_engine('sqlite:///library.db')
-Base.metadata.create_all(engine)
+class MemberStats(Base):
+    __tablename__ = 'member_stats'
+    member_id = Column(Integer, ForeignKey('members.id'), primary_key=True)
+    borrow_count = Column(Integer, default=0)
+    returned_count = Column(Integer, default=0)
+    late_count = Column(Integer, default=0)
+    total_fines = Column(Float, default=0.0)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+    for name, value in config.SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+def create_db_engine(url=None):
+    """Pooled engine for url (config.DATABASE_URL by default)
+    
+    SQLite connections get the busy timeout and config.SQLITE_PRAGMAS as they are
+    opened; other backends get pre-ping and recycling for server-side timeouts.
+    """
+    url = make_url(url or config.DATABASE_URL)
+    options = {}
+    if url.get_backend_name() == 'sqlite':
+        in_memory = url.database in (None, '', ':memory:')
+    else:
+        in_memory = False
+        options.update(pool_pre_ping=True, pool_recycle=config.DB_POOL_RECYCLE)
+    if not in_memory:
+        # An in-memory SQLite database lives in one connection, so it keeps the default pool
+        options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+                       pool_timeout=config.DB_POOL_TIMEOUT)
+    engine = create_engine(url, **options)
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine, 'connect', _apply_sqlite_pragmas)
+    return instrument_sql(engine)
+
+class LibraryCounters(Base):
+    """Single-row dashboard counters, kept in step by the LibraryManager write transactions"""
+    __tablename__ = 'library_counters'
+    id = Column(Integer, primary_key=True)  # always COUNTERS_ID
+    total_books = Column(Integer, nullable=False, default=0)
+    active_members = Column(Integer, nullable=False, default=0)
+    open_loans = Column(Integer, nullable=False, default=0)
+    total_fines = Column(Float, nullable=False, default=0.0)
+    reconciled_at = Column(DateTime, nullable=True)
+
+COUNTERS_ID = 1
+
+def bump_counters(session, **deltas):
+    """Add deltas to the dashboard counters inside the session's current transaction"""
+    session.execute(
+        update(LibraryCounters).where(LibraryCounters.id == COUNTERS_ID)
+        .values(**{name: getattr(LibraryCounters, name) + delta for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False))
+
+# Creating the engine does not connect; the schema is created by init_db()
+engine = create_db_engine()
 Session = sessionmaker(bind=engine)
+
+def scoped_sessions():
+    """A registry handing each thread its own Session; call .remove() when a request ends"""
+    return scoped_session(Session)
+_initialized = False
+
+def init_db():
+    """Create any missing tables and apply pending migrations; runs once per process"""
+    global _initialized
+    if not _initialized:
+        from migrations import migrate
+        Base.metadata.create_all(engine)
+        migrate(engine)
+        _initialized = True
+    return engine
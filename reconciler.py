@@ -0,0 +1,77 @@
+"""Periodic reconciliation of the dashboard counters
+
+Usage:
+    python reconciler.py    # reconcile once and print any drift that was fixed
+"""
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CounterReconciler:
+    """Daemon thread that resets the dashboard counters from the tables every interval seconds.
+
+    The write methods keep the counters exact; this catches drift from anything
+    that bypasses them, such as manual SQL or an interrupted bulk load.
+    """
+
+    def __init__(self, manager, interval=900):
+        self.manager = manager
+        self.interval = interval
+        self.last_run = None
+        self.last_drift = {}
+        self.last_error = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='counter-reconciler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """Reconcile now; returns {counter: (stored, actual)} for the counters that had drifted"""
+        try:
+            drift = self.manager.reconcile_counters()
+        finally:
+            self.manager.release_session()
+        if drift:
+            logger.warning("Dashboard counters drifted: %s", drift)
+        self.last_run = time.time()
+        self.last_drift = drift
+        return drift
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Counter reconciliation failed")
+
+
+if __name__ == "__main__":
+    from library_manager import LibraryManager
+
+    drift = CounterReconciler(LibraryManager()).run_once()
+    if drift:
+        for name, (stored, actual) in drift.items():
+            print(f"{name}: {stored} -> {actual}")
+    else:
+        print("Dashboard counters match the tables")
@@ -0,0 +1,148 @@
+"""Persistent TF-IDF search index over the book catalog"""
+
+import hashlib
+import numpy as np
+from scipy import sparse
+
+
+def top_k(scores, k):
+    """Return indices of the k highest scores, best first, using a partial sort.
+
+    Ties go to the lower index, i.e. catalog order, as a stable sort would.
+    """
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.array([], dtype=np.int64)
+    if k >= n:
+        candidates = np.arange(n)
+    else:
+        # The partition may keep any of the books tied with the k-th score; take
+        # those with the lowest indices instead (flatnonzero is in index order)
+        kth = scores[np.argpartition(scores, n - k)[n - k]]
+        above = np.flatnonzero(scores > kth)
+        candidates = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    # Ascending by score, then descending by index; reversed, that is best first with ties in index order
+    order = np.lexsort((-candidates, scores[candidates]))[::-1]
+    return candidates[order[:k]]
+
+
+def book_text(title, author, genre):
+    """Text that is indexed for a single book"""
+    return f"{title} {author} {genre}"
+
+
+class SearchIndex:
+    """TF-IDF matrix of the catalog, fitted once and appended to as books are added.
+
+    Added books are vectorised against the fitted IDF weights; terms the index has
+    not seen before get a column of their own so new titles are searchable at once.
+    Once the books added since the last fit exceed ``refit_ratio`` of the catalog,
+    everything is refitted so the IDF weights reflect the whole catalog again.
+    """
+
+    def __init__(self, refit_ratio=0.2):
+        self.refit_ratio = refit_ratio
+        self.vectorizer = None
+        self.vocabulary = {}
+        self.idf = np.array([])
+        self.matrix = None
+        self.book_ids = np.array([], dtype=np.int64)
+        self.texts = []
+        self.fitted_size = 0
+
+    @property
+    def size(self):
+        return len(self.book_ids)
+
+    def build(self, books_df):
+        """Fit the index on the whole catalog"""
+        self.book_ids = books_df['id'].to_numpy(dtype=np.int64)
+        self.texts = [book_text(t, a, g) for t, a, g in zip(books_df['title'], books_df['author'], books_df['genre'])]
+        self._fit()
+        return self
+
+    def _fit(self):
+        # sklearn is only imported once a search index is actually built
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.vectorizer = TfidfVectorizer(stop_words='english')
+        try:
+            self.matrix = self.vectorizer.fit_transform(self.texts).tocsr()
+            self.vocabulary = dict(self.vectorizer.vocabulary_)
+            self.idf = self.vectorizer.idf_.copy()
+        except ValueError:
+            # Empty vocabulary (e.g. only stop words); terms are added as books arrive
+            self.matrix = sparse.csr_matrix((len(self.texts), 0))
+            self.vocabulary = {}
+            self.idf = np.array([])
+        self.fitted_size = len(self.texts)
+
+    def _transform(self, texts):
+        """Vectorise texts with the current vocabulary and IDF weights"""
+        from sklearn.preprocessing import normalize
+        analyzer = self.vectorizer.build_analyzer()
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for term in analyzer(text):
+                col = self.vocabulary.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        counts = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                   shape=(len(texts), len(self.vocabulary)))
+        counts.sum_duplicates()
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    def _extend_vocabulary(self, texts):
+        """Give terms that are new to the index a column and a smoothed IDF weight"""
+        analyzer = self.vectorizer.build_analyzer()
+        doc_freq = {}
+        for text in texts:
+            for term in set(analyzer(text)):
+                if term not in self.vocabulary:
+                    doc_freq[term] = doc_freq.get(term, 0) + 1
+        if not doc_freq:
+            return
+        for term in sorted(doc_freq):
+            self.vocabulary[term] = len(self.vocabulary)
+        df = np.array([doc_freq[term] for term in sorted(doc_freq)], dtype=float)
+        self.idf = np.concatenate([self.idf, np.log((1 + self.size) / (1 + df)) + 1])
+        self.matrix.resize((self.matrix.shape[0], len(self.vocabulary)))
+
+    def matches(self, books_df):
+        """Check whether the index covers exactly the books in books_df"""
+        return (self.matrix is not None and len(books_df) == self.size and
+                np.array_equal(books_df['id'].to_numpy(dtype=np.int64), self.book_ids))
+
+    def add_books(self, books):
+        """Append books (dicts with id, title, author, genre) to the index; returns True if it refitted"""
+        if not books:
+            return False
+        texts = [book_text(b['title'], b['author'], b['genre']) for b in books]
+        self.book_ids = np.concatenate([self.book_ids, np.array([b['id'] for b in books], dtype=np.int64)])
+        self.texts.extend(texts)
+
+        if len(self.texts) - self.fitted_size > self.refit_ratio * max(self.fitted_size, 1):
+            self._fit()
+            return True
+        self._extend_vocabulary(texts)
+        self.matrix = sparse.vstack([self.matrix, self._transform(texts)], format='csr')
+        return False
+
+    def scores(self, query):
+        """Similarity of every indexed book to the query, in index order"""
+        query_vec = self._transform([query])
+        # Rows are L2-normalised, so the dot product is the cosine similarity
+        return (self.matrix @ query_vec.T).toarray().ravel()
+
+    def search(self, query, top_n=5):
+        """Return (book_id, similarity) pairs for the best matching books"""
+        if self.size == 0:
+            return []
+        scores = self.scores(query)
+        return [(self.book_ids[i], scores[i]) for i in top_k(scores, top_n)]
+
+    def fingerprint(self):
+        """Content hash of the indexed books, used as the index's artifact version"""
+        digest = hashlib.sha1(self.book_ids.tobytes())
+        digest.update('\n'.join(self.texts).encode('utf-8'))
+        return digest.hexdigest()[:16]
@@ -18,13 +18,10 @@ def seed_database():
         ("Henry Taylor", "henry@email.com")
     ]
     
-    member_ids = []
-    for name, email in members:
-        try:
-            mid = manager.add_member(name, email)
-            member_ids.append(mid)
-        except:
-            pass
+    # Bulk import skips rows already in the database, so re-seeding is safe
+    report = manager.import_records('members', enumerate(({'name': name, 'email': email}
+                                                          for name, email in members), 1))
+    member_ids = manager.get_all_members(columns=['id'])['id'].tolist() if report['inserted'] else []
     
     # Add books
     books = [
@@ -45,13 +42,10 @@ def seed_database():
         ("The Phoenix Project", "Gene Kim", "Technology", "978-0988262508", 2)
     ]
     
-    book_ids = []
-    for title, author, genre, isbn, copies in books:
-        try:
-            bid = manager.add_book(title, author, genre, isbn, copies)
-            book_ids.append(bid)
-        except:
-            pass
+    report = manager.import_records('books', enumerate(({'title': title, 'author': author, 'genre': genre,
+                                                         'isbn': isbn, 'copies': copies}
+                                                        for title, author, genre, isbn, copies in books), 1))
+    book_ids = manager.get_all_books(columns=['id'])['id'].tolist() if report['inserted'] else []
     
     # Create sample transactions
     if member_ids and book_ids:
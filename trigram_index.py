@@ -0,0 +1,165 @@
+"""Character-trigram index over book titles and authors for typo-tolerant lookup"""
+
+import re
+import unicodedata
+from array import array
+from functools import lru_cache
+from bisect import bisect_left, insort
+from difflib import SequenceMatcher
+import numpy as np
+from search_index import top_k
+
+
+def normalize_text(text):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+@lru_cache(maxsize=65536)
+def word_trigrams(word):
+    """Padded character trigrams of a single word"""
+    padded = f" {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text):
+    """Set of padded character trigrams of every word in text"""
+    grams = set()
+    for word in text.split():
+        grams |= word_trigrams(word)
+    return grams
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to catalog positions, plus a sorted prefix list.
+
+    Candidate generation only touches the posting lists of each query word's
+    ``grams_per_word`` rarest trigrams, skipping trigrams found in more than
+    ``max_df`` of the catalog (" th", "the"), and counts hits over those postings
+    alone; the (slower) edit-distance scoring then runs on at most
+    ``max_candidates`` books.
+    """
+
+    def __init__(self, max_candidates=50, min_score=0.5, grams_per_word=3, max_df=0.2):
+        self.max_candidates = max_candidates
+        self.min_score = min_score
+        self.grams_per_word = grams_per_word
+        self.max_df = max_df
+        self.book_ids = []
+        self.words = []
+        self.postings = {}
+        self.prefixes = []
+
+    @property
+    def size(self):
+        return len(self.book_ids)
+
+    def build(self, books_df):
+        """Index the whole catalog"""
+        self.__init__(self.max_candidates, self.min_score, self.grams_per_word, self.max_df)
+        self.add_books(books_df[['id', 'title', 'author']].to_dict('records'), sort=False)
+        self.prefixes.sort()
+        return self
+
+    def matches(self, books_df):
+        """Check whether the index covers exactly the books in books_df"""
+        return len(books_df) == self.size and books_df['id'].tolist() == self.book_ids
+
+    def add_books(self, books, sort=True):
+        """Append books (dicts with id, title, author) to the index"""
+        for book in books:
+            pos = len(self.book_ids)
+            title, author = normalize_text(book['title']), normalize_text(book['author'])
+            self.book_ids.append(book['id'])
+            self.words.append((title + ' ' + author).split())
+            postings = self.postings
+            for gram in trigrams(title + ' ' + author):
+                if gram not in postings:
+                    postings[gram] = array('i')
+                postings[gram].append(pos)
+            for field in (title, author):
+                # Every word start, so "prog" completes "the pragmatic programmer" too
+                words = field.split()
+                for i in range(len(words)):
+                    entry = (' '.join(words[i:]), pos)
+                    if sort:
+                        insort(self.prefixes, entry)
+                    else:
+                        self.prefixes.append(entry)
+
+    def _query_grams(self, query):
+        """The rarest indexed trigrams of each query word, leaving out very common ones"""
+        max_postings = max(self.max_df * self.size, self.max_candidates)
+        chosen, rarest = set(), []
+        for word in normalize_text(query).split():
+            grams = sorted((len(self.postings[g]), g) for g in word_trigrams(word) if g in self.postings)
+            rarest.extend(grams[:1])
+            chosen.update(g for n, g in grams[:self.grams_per_word] if n <= max_postings)
+        # A query of nothing but common words ("the") still looks up its rarest gram
+        return chosen or {g for _, g in sorted(rarest)[:1]}
+
+    def candidates(self, query):
+        """Positions of the books sharing the most of the query's selective trigrams"""
+        grams = self._query_grams(query)
+        if not grams:
+            return np.array([], dtype=np.int64)
+        # Count over the union of the postings only, not the whole catalog: once
+        # sorted, each book's hits form one run
+        hits = np.sort(np.concatenate([np.frombuffer(self.postings[g], dtype=np.int32) for g in grams]))
+        starts = np.flatnonzero(np.concatenate(([True], hits[1:] != hits[:-1])))
+        positions, counts = hits[starts], np.diff(starts, append=len(hits))
+        # Counts are a handful of small integers with huge ties, on which a partition
+        # degrades; find the count at which max_candidates is reached by counting down
+        hist = np.bincount(counts)
+        threshold, found = len(hist) - 1, 0
+        min_hits = max(1, len(grams) // 3)
+        while threshold > min_hits and found + hist[threshold] < self.max_candidates:
+            found += hist[threshold]
+            threshold -= 1
+        if threshold < min_hits:
+            return np.array([], dtype=np.int64)
+        best = np.flatnonzero(counts > threshold)
+        hit = np.concatenate([best, np.flatnonzero(counts == threshold)[:self.max_candidates - len(best)]])
+        return positions[hit[np.argsort(-counts[hit], kind='stable')]].astype(np.int64)
+
+    def _score(self, query_words, pos):
+        book_words = self.words[pos]
+        if not book_words:
+            return 0.0
+        return sum(max(SequenceMatcher(None, q, w).ratio() for w in book_words)
+                   for q in query_words) / len(query_words)
+
+    def scores(self, query):
+        """Fuzzy similarity of every book to the query (zero outside the candidates)"""
+        scores = np.zeros(self.size)
+        query_words = normalize_text(query).split()
+        if not query_words:
+            return scores
+        for pos in self.candidates(query):
+            score = self._score(query_words, pos)
+            if score >= self.min_score:
+                scores[pos] = score
+        return scores
+
+    def search(self, query, top_n=5):
+        """Return (book_id, similarity) pairs for the closest title/author matches"""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores)
+        return [(self.book_ids[p], float(scores[p])) for p in matched[top_k(scores[matched], top_n)]]
+
+    def complete(self, prefix, limit=8):
+        """Book ids whose title or author has a word sequence starting with prefix"""
+        prefix = normalize_text(prefix)
+        if not prefix:
+            return []
+        results = []
+        i = bisect_left(self.prefixes, (prefix, -1))
+        while i < len(self.prefixes) and len(results) < limit:
+            text, pos = self.prefixes[i]
+            if not text.startswith(prefix):
+                break
+            if self.book_ids[pos] not in results:
+                results.append(self.book_ids[pos])
+            i += 1
+        return results